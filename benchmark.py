@@ -0,0 +1,181 @@
+# benchmarks the collectors and whole scrapes of each SNMP backend, against a simulated ILO or a real one
+
+from prometheus_client import CollectorRegistry
+
+from orchestrator import ScrapeOrchestrator
+from probe import start_probe_server
+from render_cache import make_cached_wsgi_app
+import sim_agent
+import main
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import urllib.request
+
+BACKENDS = {
+    'pysnmp': [],
+    'asyncio': ['--snmp-asyncio'],
+    'lite': ['--snmp-lite'],
+}
+
+arg_parser = argparse.ArgumentParser(description='Benchmarks each collector and the whole /metrics scrape for each SNMP backend. Without --ilo-address, a simulated ILO is started to benchmark against, so no real one is needed.')
+arg_parser.add_argument('-i', '--ilo-address', help='ILO IP address or hostname to benchmark against. Bytes on the wire are only known for the simulated ILO.')
+arg_parser.add_argument('-c', '--snmp-community', default='public', help='SNMP community to read.')
+arg_parser.add_argument('--snmp-port', default=161, type=int, help='SNMP port of the ILO given with --ilo-address.')
+arg_parser.add_argument('-r', '--rounds', default=20, type=int, help='Number of collections to time for each collector and backend.')
+arg_parser.add_argument('-b', '--backends', default=','.join(BACKENDS), help='Comma separated list of backends to compare.')
+arg_parser.add_argument('--chunk-size', default=64, type=int, help='Fixed number of var binds per request, so every backend sends the same requests.')
+arg_parser.add_argument('-e', '--exporter-arg', action='append', default=[], help='Extra argument to give the exporter, like --table-fetch. Can be given more than once.')
+arg_parser.add_argument('--json', help='File to write the results to as JSON, for comparing between commits.')
+arg_parser.add_argument('--latency', default=0.001, type=float, help='Seconds the simulated ILO waits before each response.')
+arg_parser.add_argument('--loss', default=0, type=float, help='Share of requests the simulated ILO drops, from 0 to 1.')
+arg_parser.add_argument('--max-var-binds', type=int, help='Have the simulated ILO answer requests with more var binds than this with tooBig.')
+arg_parser.add_argument('--walk', help='Output of snmpwalk -On for the simulated ILO to answer from, instead of made up tables.')
+for table, size in sim_agent.DEFAULT_SIZES.items():
+    arg_parser.add_argument('--%ss' % table if table != 'memory' else '--memory', default=size, type=int, dest=table, metavar='N', help='Number of rows in the simulated %s table.' % table)
+
+
+class AgentProcess(object):
+    """ runs sim_agent.py in a process of its own, so it doesn't take CPU time from the exporter """
+    def __init__(self, args):
+        command = [sys.executable, sim_agent.__file__, '--latency', str(args.latency), '--loss', str(args.loss)]
+        if args.max_var_binds is not None:
+            command += ['--max-var-binds', str(args.max_var_binds)]
+        if args.walk is not None:
+            command += ['--walk', args.walk]
+        for table in sim_agent.TABLES:
+            command += ['--%ss' % table if table != 'memory' else '--memory', str(getattr(args, table))]
+
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        self.info = json.loads(self._process.stdout.readline())
+
+    def get_stats(self) -> dict[str, int]:
+        self._process.stdin.write('stats\n')
+        self._process.stdin.flush()
+        return json.loads(self._process.stdout.readline())
+
+    def stop(self):
+        self._process.kill()
+
+
+def measure(function, rounds: int, pdu_count, agent: AgentProcess | None) -> dict[str, float | None]:
+    """ times function over the rounds, then runs it once more to find its peak memory use """
+    start_pdus = pdu_count()
+    start_stats = agent.get_stats() if agent is not None else None
+    start_wall, start_cpu = time.monotonic(), time.process_time()
+    for _ in range(rounds):
+        function()
+    wall, cpu = time.monotonic() - start_wall, time.process_time() - start_cpu
+    pdus = pdu_count() - start_pdus
+
+    bytes_on_wire = None
+    if agent is not None:
+        stats = agent.get_stats()
+        bytes_on_wire = (stats['bytes_in'] + stats['bytes_out'] - start_stats['bytes_in'] - start_stats['bytes_out']) / rounds
+
+    tracemalloc.start()
+    function()
+    start_memory, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'seconds': wall / rounds,
+        'pdus': pdus / rounds,
+        'bytes_on_wire': bytes_on_wire,
+        'cpu_ms': cpu * 1000 / rounds,
+        'peak_memory_kb': peak_memory / 1024,
+    }
+
+
+def benchmark(backend: str, host: str, port: int, args, agent: AgentProcess | None) -> dict[str, dict]:
+    main.init(main.arg_parser.parse_args([
+        '-q',
+        '-c', args.snmp_community,
+        '--snmp-chunk-size', str(args.chunk_size),
+        '--snmp-max-chunk-size', str(args.chunk_size),
+        *BACKENDS[backend],
+        *args.exporter_arg,
+    ]))
+
+    results = {}
+    config = main.create_snmp_config(host, port, args.snmp_community)
+    for collector in main.create_collectors(config, None):
+        list(collector.collect())  # warm up caches
+        results[getattr(collector, 'group', type(collector).__name__)] = measure(lambda: list(collector.collect()), args.rounds, lambda: config.pdu_count, agent)
+
+    # the whole thing, like prometheus would see it
+    config = main.create_snmp_config(host, port, args.snmp_community)
+    registry = CollectorRegistry()
+    registry.register(ScrapeOrchestrator(config, main.create_collectors(config, None), main.scrape_executor, main.args.max_concurrency, on_failure=main.scrape_failed))
+    server, _ = start_probe_server(0, '127.0.0.1', make_cached_wsgi_app(registry))
+    url = 'http://127.0.0.1:%i/metrics' % server.server_port
+
+    def scrape():
+        with urllib.request.urlopen(url) as response:
+            response.read()
+
+    try:
+        scrape()  # warm up caches
+        results['/metrics'] = measure(scrape, args.rounds, lambda: config.pdu_count, agent)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    args = arg_parser.parse_args()
+
+    backends = args.backends.split(',')
+    for name in backends:
+        if name not in BACKENDS:
+            print('unknown backend', name)
+            exit(1)
+
+    agent = None
+    if args.ilo_address is None:
+        agent = AgentProcess(args)
+        host, port = agent.info['address'], agent.info['port']
+        print('started simulated ILO on %s:%i with %i oids' % (host, port, agent.info['oids']))
+    else:
+        host, port = args.ilo_address, args.snmp_port
+
+    results = {}
+    try:
+        for name in backends:
+            print('benchmarking', name + '...')
+            results[name] = benchmark(name, host, port, args, agent)
+    finally:
+        if agent is not None:
+            agent.stop()
+
+    fields = ['seconds', 'pdus', 'bytes_on_wire', 'cpu_ms', 'peak_memory_kb']
+    print()
+    print('%-10s %-14s' % ('backend', 'collector') + ''.join('%16s' % field for field in fields))
+    for name, collectors in results.items():
+        for collector, result in collectors.items():
+            print('%-10s %-14s' % (name, collector) + ''.join('%16s' % ('-' if result[field] is None else '%.4f' % result[field]) for field in fields))
+
+    if args.json is not None:
+        settings = {key: value for key, value in vars(args).items() if key != 'json'}
+        with open(args.json, 'w') as f:
+            json.dump({
+                'commit': get_commit(),
+                'time': time.time(),
+                'simulated': agent is not None,
+                'settings': settings,
+                'results': results,
+            }, f, indent=2)
+        print('wrote results to', args.json)
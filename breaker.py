@@ -0,0 +1,103 @@
+# stops asking an ILO that isn't answering for a while, instead of waiting out every timeout and retry on every scrape
+
+import threading
+import time
+
+# states, as reported by ilo_exporter_circuit_state
+CLOSED = 0
+HALF_OPEN = 1
+OPEN = 2
+
+DEFAULT_THRESHOLD = 3
+DEFAULT_BACKOFF = 10
+DEFAULT_MAX_BACKOFF = 120
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker(object):
+    """
+    Counts requests to an ILO that got no answer in a row. After threshold of them the circuit opens, and requests fail
+    right away with CircuitOpenError instead of being sent. Once the backoff is over the circuit is half open, and the
+    next request is let through as a probe: an answer closes the circuit again, and no answer opens it for twice as
+    long as before, up to max_backoff. Everything else still fails while half open, so a dead ILO isn't hit by every
+    collector at once. A scrape that starts the probe sends a GET of probe_oid as it, if there is one. A probe that
+    never got an answer either way is given up on after the backoff, and another one goes out.
+    Anything that got a response counts as an answer, even an error.
+    """
+    def __init__(self, name: str, threshold: int = DEFAULT_THRESHOLD, backoff: float = DEFAULT_BACKOFF, max_backoff: float = DEFAULT_MAX_BACKOFF, probe_oid: tuple[int] | None = None):
+        self.name = name
+        self.probe_oid = probe_oid
+        self.state = CLOSED
+        self.opens = 0  # number of times the circuit opened
+        self._threshold = threshold
+        self._min_backoff = backoff
+        self._max_backoff = max_backoff
+        self._backoff = backoff
+        self._failures = 0  # in a row
+        self._retry_at = 0  # when to probe next, when open
+        self._probe_sent = False  # whether the probe went out, when half open
+        self._lock = threading.Lock()
+
+    @property
+    def failing(self) -> bool:
+        """ whether the last request got no answer """
+        return self._failures > 0
+
+    def _try_probe(self):
+        """ needs the lock. half opens the circuit if there's no probe waiting, or raises CircuitOpenError """
+        if self.state == HALF_OPEN and not self._probe_sent:
+            return
+
+        remaining = self._retry_at - time.monotonic()
+        if remaining > 0:
+            if self.state == HALF_OPEN:
+                raise CircuitOpenError('%s is not answering, waiting on a check whether it is back' % self.name)
+            raise CircuitOpenError('%s is not answering, trying again in %.0f seconds' % (self.name, remaining))
+        self.state = HALF_OPEN
+        self._probe_sent = False
+        self._retry_at = time.monotonic() + self._backoff
+
+    def check_request(self):
+        """ raises CircuitOpenError if a request shouldn't be sent """
+        if self.state == CLOSED:
+            return
+        with self._lock:
+            if self.state != CLOSED:
+                self._try_probe()
+                self._probe_sent = True  # this is it
+
+    def check_scrape(self) -> bool:
+        """ raises CircuitOpenError if a scrape shouldn't start, or returns whether to probe first """
+        if self.state == CLOSED:
+            return False
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+            self._try_probe()
+            return True
+
+    def succeeded(self):
+        if self.state == CLOSED and self._failures == 0:
+            return
+        with self._lock:
+            if self.state != CLOSED:
+                print('%s is answering again' % self.name)
+            self.state = CLOSED
+            self._failures = 0
+            self._backoff = self._min_backoff
+
+    def failed(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN:
+                self._backoff = min(self._backoff * 2, self._max_backoff)
+            elif self.state == OPEN or self._failures < self._threshold:
+                return
+
+            print('%s is not answering, backing off for %.0f seconds' % (self.name, self._backoff))
+            self.state = OPEN
+            self.opens += 1
+            self._retry_at = time.monotonic() + self._backoff
@@ -0,0 +1,126 @@
+# learns how many var binds each ilo is happy to get in a single request
+
+import json
+import os
+import threading
+
+# I find large requests crash the ilo (lol), but how large depends on the ilo version
+MIN_CHUNK = 4
+START_CHUNK = 16
+MAX_CHUNK = 128
+
+# number of full requests to average before deciding to grow
+SAMPLES = 5
+
+# how much slower per var bind a larger size has to be to go back, so noise doesn't stop it from growing
+TOLERANCE = 1.1
+
+# after this many requests without trouble, let it grow a step past a size that failed or stopped paying off before
+RELAX_AFTER = 500
+
+
+class ChunkSizeStore(object):
+    """ remembers the learned chunk size of each target in a json file, so they don't have to be learned again """
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+        self._sizes = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._sizes = json.load(f)
+            except (OSError, ValueError) as e:
+                print('failed to read chunk sizes from', path, e)
+
+    def get(self, target: str) -> int | None:
+        return self._sizes.get(target)
+
+    def put(self, target: str, size: int):
+        with self._lock:
+            self._sizes[target] = size
+            temp_path = self._path + '.tmp'
+            try:
+                with open(temp_path, 'w') as f:
+                    json.dump(self._sizes, f)
+                os.replace(temp_path, self._path)
+            except OSError as e:
+                print('failed to save chunk sizes to', self._path, e)
+
+
+class AdaptiveChunkSize(object):
+    """
+    The number of var binds to put in a single request to a target. It starts out small and keeps growing as long as
+    the time spent per var bind goes down. Errors and timeouts shrink it by half, but only tooBig keeps it from growing
+    past the size that failed again, since a timeout could just as well be the ILO being busy or down. The ceiling is
+    raised a step at a time again after every RELAX_AFTER requests that went fine.
+    """
+    def __init__(self, size: int = START_CHUNK, min_size: int = MIN_CHUNK, max_size: int = MAX_CHUNK, on_change: any = None):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = max(min_size, min(size, max_size))
+        self.grown = 0  # number of adjustments in each direction
+        self.shrunk = 0
+        self._on_change = on_change
+        self._ceiling = max_size
+        self._costs = {}  # {size: average seconds per var bind}
+        self._previous = None  # the size before the last time it grew
+        self._samples = 0
+        self._successes = 0  # since the ceiling last moved
+        self._lock = threading.Lock()
+
+    def _set_size(self, size: int):
+        if size > self.size:
+            self.grown += 1
+        elif size < self.size:
+            self.shrunk += 1
+        else:
+            return
+
+        self.size = size
+        self._samples = 0
+        if self._on_change is not None:
+            self._on_change(size)
+
+    def _set_ceiling(self, ceiling: int):
+        self._ceiling = ceiling
+        self._successes = 0
+
+    def succeeded(self, var_binds: int, seconds: float):
+        with self._lock:
+            self._successes += 1
+            if self._successes >= RELAX_AFTER and self._ceiling < self.max_size:
+                self._set_ceiling(min(self.max_size, self._ceiling * 3 // 2))
+
+            # only requests that are about as big as allowed say anything about the size
+            if var_binds < self.size * 3 // 4:
+                return
+
+            cost = seconds / var_binds
+            average = self._costs.get(self.size)
+            self._costs[self.size] = cost if average is None else average * 0.7 + cost * 0.3
+            self._samples += 1
+
+            if self._samples < SAMPLES or self.size >= self._ceiling:
+                return
+
+            previous_cost = self._costs.get(self._previous)
+            if previous_cost is not None and self._costs[self.size] > previous_cost * TOLERANCE:
+                # bigger requests stopped paying off, go back to the last size and stay there
+                self._set_ceiling(self._previous)
+                self._set_size(self._previous)
+            else:
+                self._previous = self.size
+                self._set_size(min(self._ceiling, self.size * 3 // 2))
+
+    def failed(self, var_binds: int, too_big: bool = True):
+        """ a request of this many var binds got tooBig, or no answer at all """
+        with self._lock:
+            if too_big:
+                self._set_ceiling(max(self.min_size, min(self._ceiling, var_binds - 1)))
+            if var_binds > self.size:
+                return  # sent before the last time it shrunk, which already took care of it
+
+            self._costs.clear()
+            self._previous = None
+            self._set_size(max(self.min_size, min(self.size, var_binds) // 2))
@@ -0,0 +1,84 @@
+# scrape deadlines, so one slow table on an ILO can't make a whole scrape run past the scrape timeout of prometheus
+
+from contextlib import contextmanager
+import threading
+import time
+
+TIMEOUT_HEADER = 'HTTP_X_PROMETHEUS_SCRAPE_TIMEOUT_SECONDS'
+
+# seconds to leave between the end of the work on a scrape and the scrape timeout, for rendering and the network
+DEFAULT_OFFSET = 0.5
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline(object):
+    """ the time a scrape has to be done by. None is used everywhere for no deadline at all """
+    def __init__(self, seconds: float):
+        self.at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.at
+
+
+def check_deadline(deadline: Deadline | None):
+    """ raises DeadlineExceeded if there's no time left, so no more requests are started """
+    if deadline is not None and deadline.expired:
+        raise DeadlineExceeded('ran out of time')
+
+
+def time_left(deadline: Deadline | None, limit: float | None) -> float | None:
+    """ returns whichever is less, the limit or the time left, with None meaning no limit """
+    if deadline is None:
+        return limit
+    if limit is None:
+        return deadline.remaining()
+    return min(limit, deadline.remaining())
+
+
+# prometheus_client collectors don't take arguments, so the deadline of the scrape going on in a thread is kept here for
+# them. everything below them gets it passed along instead
+_current = threading.local()
+
+
+def current_deadline() -> Deadline | None:
+    return getattr(_current, 'deadline', None)
+
+
+@contextmanager
+def deadline_scope(deadline: Deadline | None):
+    previous = current_deadline()
+    _current.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _current.deadline = previous
+
+
+class ScrapeBudget(object):
+    """
+    Works out the deadline of each scrape from the X-Prometheus-Scrape-Timeout-Seconds header, or the configured timeout
+    if there isn't one, whichever is shorter, less the offset.
+    """
+    def __init__(self, timeout: float | None = None, offset: float = DEFAULT_OFFSET):
+        self._timeout = timeout
+        self._offset = offset
+
+    def get_deadline(self, environ: dict) -> Deadline | None:
+        seconds = self._timeout
+        header = environ.get(TIMEOUT_HEADER)
+        if header:
+            try:
+                seconds = float(header) if seconds is None else min(seconds, float(header))
+            except ValueError:
+                print('ignoring bad scrape timeout header:', header)
+
+        if seconds is None:
+            return None
+        return Deadline(max(0.0, seconds - self._offset))
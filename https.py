@@ -1,21 +1,218 @@
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPSConnectionPool
+from targets.temp import TEMP_ENDPOINT
+from deadline import Deadline, check_deadline, time_left
+from breaker import CircuitBreaker
+from ratelimit import TokenBucket, reserve
+
 import requests as r
 import json
+import threading
+import time
+
+# number of connections to keep open to each ILO. the web server on the ILO is slow enough without a crowd
+MAX_CONNECTIONS = 2
+
+# seconds to keep the responses of each endpoint for by default. anything not listed is always fetched again, though
+# it's still only sent again if it changed, when the ILO gives out ETag or Last-Modified headers
+ENDPOINT_TTLS = {
+    TEMP_ENDPOINT: 3600,  # sensor names, positions and thresholds. the readings come from SNMP
+}
+
+LOGIN_ENDPOINT = 'json/login_session'
 
 
 class HttpsConfiguration(object):
-    def __init__(self, host: str, username: str, password: str, ssl_verify: str | bool, timeout: int):
+    def __init__(self, host: str, username: str, password: str, ssl_verify: str | bool, timeout: int, transport: any = None, stats: any = None, max_connections: int = MAX_CONNECTIONS, ttls: dict[str, float] = ENDPOINT_TTLS, breaker: CircuitBreaker | None = None, request_limit: TokenBucket | None = None):
         self.host = host
         self.username = username
         self.password = password
         self.ssl_verify = ssl_verify
         self.timeout = timeout
+        self.transport = transport  # anything with get_json(c, endpoint, deadline) to use instead of the ILO, see replay.py
+        self.stats = stats  # a ScrapeStats to count requests and handshakes in
+        self.ttls = ttls  # {endpoint: seconds to keep its responses for}
+        self.breaker = breaker
+        self.request_limit = request_limit  # requests per second to the ILO, logins included
+        self.session = HttpsSession(self, max_connections)
+        if stats is not None and breaker is not None:
+            stats.breakers['https'] = breaker
+
+
+class CachedResponse(object):
+    def __init__(self, data, etag: str | None, last_modified: str | None):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched = time.monotonic()
+
+
+class HttpsSession(object):
+    """
+    Keeps connections to an ILO open between requests, so each one doesn't need a TCP and TLS handshake of its own, and
+    logs in once to reuse the session cookie of the ILO, instead of sending the password with every request. The login
+    is done again whenever the ILO stops taking the cookie. ILOs that can't log in this way get basic auth, like before.
+    At most max_connections requests are made at once, anything past that waits for a connection to free up.
+    Responses are kept for as long as the ttl of their endpoint allows, and after that they're only sent again by the
+    ILO if they changed, if it supports ETag or Last-Modified.
+    With a deadline, no request is started past it, and the timeout of each request is cut down to the time left.
+    Requests that can't connect or time out count against the circuit breaker, if there is one. Requests past the rate
+    limit wait their turn, unless that's past the deadline.
+    """
+    def __init__(self, c: HttpsConfiguration, max_connections: int):
+        self._c = c
+        self._session = r.Session()
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, pool_block=True)
+        self._session.mount('https://', adapter)
+        adapter.poolmanager.pool_classes_by_scheme = {**adapter.poolmanager.pool_classes_by_scheme, 'https': self._make_pool_class()}
+
+        self._logged_in = False
+        self._logins = 0  # so requests that failed on the same session only log in again once
+        self._use_login = True  # cleared if the ILO doesn't do login sessions
+        self._login_lock = threading.Lock()
+        self._handshake = threading.local()  # seconds spent on handshakes by the request of the current thread
+        self._handshake_seconds = 0.0  # average, for guessing the time saved by reusing connections
+        self._cache = {}  # {endpoint: CachedResponse}
+
+    def _make_pool_class(self) -> type:
+        session = self
+
+        class TimedPool(HTTPSConnectionPool):
+            """ times the handshake of each new connection """
+            def _new_conn(self):
+                conn = super()._new_conn()
+                connect = conn.connect
+
+                def timed_connect():
+                    start = time.monotonic()
+                    connect()
+                    session._handshake.seconds = (getattr(session._handshake, 'seconds', None) or 0) + time.monotonic() - start
+
+                conn.connect = timed_connect
+                return conn
+
+        return TimedPool
+
+    def _url(self, endpoint: str) -> str:
+        return 'https://%s/%s' % (self._c.host, endpoint)
+
+    def _count(self, **amounts: float):
+        if self._c.stats is not None:
+            self._c.stats.count(**amounts)
+
+    def _throttle(self, deadline: Deadline | None):
+        if self._c.request_limit is None:
+            return
+        seconds = reserve([(self._c.request_limit, 1)], deadline)
+        if seconds > 0:
+            self._count(https_throttled_requests=1, https_throttle_seconds=seconds)
+            time.sleep(seconds)
+
+    def _request(self, method: str, endpoint: str, deadline: Deadline | None, **kwa) -> r.Response:
+        check_deadline(deadline)
+        breaker = self._c.breaker
+        if breaker is not None:
+            breaker.check_request()
+        self._throttle(deadline)
+
+        timeout = time_left(deadline, self._c.timeout)
+        self._handshake.seconds = None
+        try:
+            response = self._session.request(method, self._url(endpoint), verify=self._c.ssl_verify, timeout=(timeout, timeout), **kwa)
+        except (r.ConnectionError, r.Timeout) as e:
+            if isinstance(e, r.Timeout):
+                check_deadline(deadline)  # cut short by the deadline, rather than the ILO being slow
+            if breaker is not None:
+                breaker.failed()
+            raise e
+        if breaker is not None:
+            breaker.succeeded()
+
+        seconds = self._handshake.seconds
+        if seconds is not None:
+            self._handshake_seconds = seconds if self._handshake_seconds == 0 else self._handshake_seconds * 0.9 + seconds * 0.1
+            self._count(https_requests=1, https_handshakes=1, https_handshake_seconds=seconds)
+        else:
+            self._count(https_requests=1, https_reused_connections=1, https_saved_seconds=self._handshake_seconds)
+        return response
+
+    def _login(self, deadline: Deadline | None):
+        """ needs the login lock """
+        self._session.cookies.clear()
+        self._logged_in = False
+        response = self._request('POST', LOGIN_ENDPOINT, deadline, json={'method': 'login', 'user_login': self._c.username, 'password': self._c.password})
+        self._count(https_logins=1)
+        if response.status_code in (404, 405):
+            print('ILO at %s does not do login sessions, using basic auth instead' % self._c.host)
+            self._use_login = False
+            return
+
+        response.raise_for_status()
+        session_key = response.json().get('session_key')
+        if session_key is not None and 'sessionKey' not in self._session.cookies:
+            self._session.cookies.set('sessionKey', session_key)
+        self._logged_in = True
+        self._logins += 1
+
+    def _ensure_login(self, deadline: Deadline | None, failed_login: int | None = None):
+        """ logs in if it hasn't yet, or again if failed_login is still the latest one """
+        with self._login_lock:
+            if self._use_login and (not self._logged_in or failed_login == self._logins):
+                self._login(deadline)
+
+    def _get(self, endpoint: str, headers: dict[str, str], deadline: Deadline | None) -> r.Response:
+        self._ensure_login(deadline)
+        if not self._use_login:
+            return self._request('GET', endpoint, deadline, headers=headers, auth=(self._c.username, self._c.password))
+
+        login = self._logins
+        response = self._request('GET', endpoint, deadline, headers=headers)
+        if response.status_code in (401, 403):
+            # the session expired, or the ILO was reset
+            self._ensure_login(deadline, login)
+            response = self._request('GET', endpoint, deadline, headers=headers, auth=None if self._use_login else (self._c.username, self._c.password))
+        return response
+
+    def invalidate(self, endpoint: str):
+        """ forgets the cached response of an endpoint, so it's fetched again next time """
+        self._cache.pop(endpoint, None)
+
+    def get_json(self, endpoint: str, deadline: Deadline | None = None):
+        ttl = self._c.ttls.get(endpoint, 0)
+        cached = self._cache.get(endpoint)
+        if cached is not None and time.monotonic() - cached.fetched < ttl:
+            self._count(https_cache_hits=1)
+            return cached.data
+
+        headers = {}
+        if cached is not None and cached.etag is not None:
+            headers['If-None-Match'] = cached.etag
+        if cached is not None and cached.last_modified is not None:
+            headers['If-Modified-Since'] = cached.last_modified
+
+        response = self._get(endpoint, headers, deadline)
+        if response.status_code == 304 and cached is not None:
+            self._count(https_not_modified=1)
+            cached.fetched = time.monotonic()
+            return cached.data
+
+        response.raise_for_status()
+        data = json.loads(response.text)
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if ttl > 0 or etag is not None or last_modified is not None:
+            self._cache[endpoint] = CachedResponse(data, etag, last_modified)
+        return data
+
+
+def fetch_json_response(c: HttpsConfiguration, endpoint: str, deadline: Deadline | None = None):
+    """ always asks the ILO, even with a transport set """
+    return c.session.get_json(endpoint, deadline)
 
 
-def get_json_response(c: HttpsConfiguration, endpoint: str):
-    response = r.get(
-        'https://%s/%s' % (c.host, endpoint),
-        auth=(c.username, c.password),
-        verify=c.ssl_verify,
-        timeout=(c.timeout, c.timeout)
-    )
-    return json.loads(response.text)
+def get_json_response(c: HttpsConfiguration, endpoint: str, deadline: Deadline | None = None):
+    if c.transport is not None:
+        return c.transport.get_json(c, endpoint, deadline)
+    return fetch_json_response(c, endpoint, deadline)
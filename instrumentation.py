@@ -0,0 +1,145 @@
+# metrics about how the exporter itself is doing for each ILO, cheap enough to always keep on
+
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+
+from contextlib import contextmanager
+import bisect
+import threading
+import time
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# {counter: documentation}
+COUNTERS = {
+    'snmp_pdus': 'Number of SNMP requests sent to the ILO',
+    'snmp_var_binds': 'Number of var binds asked for in SNMP requests to the ILO, counting every row asked for by GETBULK',
+    'snmp_sent_bytes': 'Number of bytes of SNMP requests sent to the ILO, including retries. Only counted by the built-in SNMP client',
+    'snmp_received_bytes': 'Number of bytes of SNMP responses received from the ILO. Only counted by the built-in SNMP client',
+    'snmp_timeouts': 'Number of SNMP requests to the ILO that got no response, even after retrying',
+    'snmp_retries': 'Number of times an SNMP request to the ILO was sent again after getting no response in time. Only counted by the built-in SNMP client',
+    'snmp_throttled_requests': 'Number of SNMP requests to the ILO that had to wait on the rate limit',
+    'snmp_throttle_seconds': 'Seconds SNMP requests to the ILO spent waiting on the rate limit',
+    'coalesced_scrapes': 'Number of scrapes of the ILO that were answered by a scrape already going on at the same time, or one that just finished, instead of asking the ILO again',
+    'https_requests': 'Number of HTTPS requests made to the ILO, including logins',
+    'https_logins': 'Number of times the exporter logged in to the web interface of the ILO',
+    'https_handshakes': 'Number of new HTTPS connections made to the ILO, each needing a TCP and TLS handshake',
+    'https_handshake_seconds': 'Seconds spent on TCP and TLS handshakes with the ILO',
+    'https_reused_connections': 'Number of HTTPS requests to the ILO that reused an open connection, saving a handshake',
+    'https_saved_seconds': 'Estimated seconds saved by reusing open HTTPS connections, going by the average handshake',
+    'https_throttled_requests': 'Number of HTTPS requests to the ILO that had to wait on the rate limit',
+    'https_throttle_seconds': 'Seconds HTTPS requests to the ILO spent waiting on the rate limit',
+    'https_cache_hits': 'Number of HTTPS responses from the ILO that were reused from the cache without asking',
+    'https_not_modified': 'Number of HTTPS responses from the ILO that were still the same when asked again, so the cached one was reused',
+}
+
+
+class Histogram(object):
+    """ a bare bones histogram with labels, since the prometheus_client ones can't be kept apart for each ILO """
+    def __init__(self, buckets: tuple = BUCKETS):
+        self._buckets = buckets
+        self._series = {}  # {labels: [count in each bucket, then everything past the last one, then the sum]}
+
+    def observe(self, labels: tuple, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series.setdefault(labels, [0] * (len(self._buckets) + 2))
+        series[bisect.bisect_left(self._buckets, value)] += 1
+        series[-1] += value
+
+    def to_family(self, name: str, documentation: str, label_names: list[str]) -> HistogramMetricFamily:
+        family = HistogramMetricFamily(name, documentation, labels=label_names)
+        for labels, series in list(self._series.items()):
+            total = 0
+            buckets = []
+            for bound, count in zip(self._buckets + (float('inf'),), series):
+                total += count
+                buckets.append((str(bound) if bound != float('inf') else '+Inf', total))
+            family.add_metric(list(labels), buckets, series[-1])
+        return family
+
+
+class ScrapeStats(object):
+    """
+    Counts what goes on between the exporter and a single ILO: SNMP traffic, how long each collector and each phase of
+    a scrape takes, how many items each collector found and whether it finished in time. Shared phases that every
+    collector waits on, like the packed GET requests, are timed under the collector "shared".
+    """
+    def __init__(self):
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self._items = {}  # {group: number of items}
+        self._outcomes = {}  # {collector: whether it finished before the deadline last scrape}
+        self.breakers = {}  # {protocol: CircuitBreaker}
+        self._scrapes = Histogram()
+        self._collectors = Histogram()
+        self._phases = Histogram()
+        self._lock = threading.Lock()
+
+    def count(self, **amounts: int):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.counters[name] += amount
+
+    def set_items(self, group: str, count: int):
+        self._items[group] = count
+
+    def set_outcome(self, collector: str, finished: bool):
+        self._outcomes[collector] = finished
+
+    def observe_scrape(self, seconds: float):
+        with self._lock:
+            self._scrapes.observe((), seconds)
+
+    def observe_collector(self, collector: str, seconds: float):
+        with self._lock:
+            self._collectors.observe((collector,), seconds)
+
+    def observe_phase(self, collector: str, phase: str, seconds: float):
+        with self._lock:
+            self._phases.observe((collector, phase), seconds)
+
+    @contextmanager
+    def phase(self, collector: str, phase: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe_phase(collector, phase, time.monotonic() - start)
+
+    def collect(self):
+        with self._lock:
+            counters = dict(self.counters)
+            yield self._scrapes.to_family('ilo_exporter_scrape_duration_seconds', 'Seconds taken by each scrape of the ILO, from the first request to the last metric built', [])
+            yield self._collectors.to_family('ilo_exporter_collector_duration_seconds', 'Seconds taken by the work of each collector, not counting shared phases', ['collector'])
+            yield self._phases.to_family('ilo_exporter_phase_duration_seconds', 'Seconds taken by each phase of collecting: sentinel, scan, fetch, https and build', ['collector', 'phase'])
+
+        for name, documentation in COUNTERS.items():
+            metric = CounterMetricFamily('ilo_exporter_%s' % name, documentation)
+            metric.add_metric([], counters[name])
+            yield metric
+
+        metric = GaugeMetricFamily('ilo_exporter_discovered_items', 'Number of items found by the last scan of each collector', labels=['group'])
+        for group, count in list(self._items.items()):
+            metric.add_metric([group], count)
+        yield metric
+
+        outcomes = list(self._outcomes.items())
+        success = GaugeMetricFamily('ilo_exporter_collector_success', 'Whether each collector finished before the deadline of the last scrape', labels=['collector'])
+        timed_out = GaugeMetricFamily('ilo_exporter_collector_timed_out', 'Whether each collector was left out of the last scrape for running out of time', labels=['collector'])
+        for collector, finished in outcomes:
+            success.add_metric([collector], 1 if finished else 0)
+            timed_out.add_metric([collector], 0 if finished else 1)
+        yield success
+        yield timed_out
+
+        breakers = list(self.breakers.items())
+        state = GaugeMetricFamily('ilo_exporter_circuit_state', 'State of the circuit breaker of each protocol to the ILO: 0 is closed (asking the ILO), 1 is half open (checking whether it answers again) and 2 is open (not asking it)', labels=['protocol'])
+        opens = CounterMetricFamily('ilo_exporter_circuit_opens', 'Number of times the ILO stopped answering a protocol, so requests stopped being sent for a while', labels=['protocol'])
+        for protocol, breaker in breakers:
+            state.add_metric([protocol], breaker.state)
+            opens.add_metric([protocol], breaker.opens)
+        yield state
+        yield opens
+
+
+def get_collector_name(collector) -> str:
+    return getattr(collector, 'group', type(collector).__name__)
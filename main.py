@@ -1,15 +1,27 @@
-from prometheus_client import start_http_server, Counter
+from prometheus_client import Counter
 from prometheus_client.core import REGISTRY, GaugeMetricFamily
 from prometheus_client.registry import Collector
+from prometheus_client.samples import Sample
 
-from pysnmp.entity.engine import SnmpEngine
 from pysnmp.hlapi import CommunityData, UdpTransportTarget, ContextData
 
-from https import HttpsConfiguration
-from snmp import SnmpConfiguration, snmp_get
+from https import HttpsConfiguration, MAX_CONNECTIONS, ENDPOINT_TTLS
+from snmp import SnmpConfiguration, EnginePool, AsyncEngine, RequestPlan, snmp_table, parse_oid, MAX_REPETITIONS, WINDOW
+from snmp_lite import LiteEngine
+from chunk_size import AdaptiveChunkSize, ChunkSizeStore, MIN_CHUNK, START_CHUNK, MAX_CHUNK
+from probe import ProbeTargets, make_probe_app, start_probe_server
+from render_cache import make_cached_wsgi_app
+from instrumentation import ScrapeStats
+from replay import SessionRecorder, RecordingEngine, Session, ReplayEngine
+from deadline import Deadline, DeadlineExceeded, ScrapeBudget, current_deadline, time_left, DEFAULT_OFFSET
+from breaker import CircuitBreaker, CircuitOpenError, DEFAULT_THRESHOLD, DEFAULT_BACKOFF, DEFAULT_MAX_BACKOFF
+from ratelimit import TokenBucket
+from orchestrator import PlannedCollector, ScrapeOrchestrator
+from poller import BackgroundPoller, PollScheduler, parse_intervals
+from stale import StaleWhileRevalidate
 import scrape
 
-from snmp_groups import BulkValues, BulkDummyValue, BulkPredeterminedValues
+from snmp_groups import BulkValues, BulkDummyValue, BulkPredeterminedValues, TableFrame, ColumnCache, TTLS, STATIC, SLOW
 from targets.temp import *
 from targets.fan import *
 from targets.cpu import *
@@ -17,8 +29,12 @@ from targets.drive import *
 from targets.memory import *
 from targets.power import *
 
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 import argparse
+import math
 import os
+import threading
+import time
 import traceback
 
 NAMESPACE = 'ilo'
@@ -29,20 +45,55 @@ arg_parser = argparse.ArgumentParser(
     description='A fast(er) prometheus exporter for applicable HP servers using SNMP via the ILO controller. v%s' % VERSION,
 )
 
-arg_parser.add_argument('-i', '--ilo-address', help='ILO IP address to scan.', required=True)
+arg_parser.add_argument('-i', '--ilo-address', help='ILO IP address to scan. If this is left out, the exporter only serves ILOs requested through the /probe endpoint.')
 arg_parser.add_argument('-a', '--server-address', default='0.0.0.0', help='Address to bind for hosting the metrics endpoint.')
-arg_parser.add_argument('-p', '--server-port', default=6969, help='Port to bind for the metrics endpoint.')
-arg_parser.add_argument('-c', '--snmp-community', default='public', help='SNMP community to read.')
-arg_parser.add_argument('--snmp-port', default=161, help='SNMP port to use.')
+arg_parser.add_argument('-p', '--server-port', default=6969, type=int, help='Port to bind for the metrics endpoint.')
+arg_parser.add_argument('-c', '--snmp-community', default='public', help='SNMP community to read. This is also the default community for the /probe endpoint.')
+arg_parser.add_argument('--snmp-port', default=161, type=int, help='SNMP port to use. This is also the default port for the /probe endpoint.')
+arg_parser.add_argument('--snmp-max-repetitions', default=MAX_REPETITIONS, type=int, help='Number of table rows to ask for in each GETBULK request when scanning. Set to 0 to scan one row at a time with GETNEXT, which is slower but may be needed for misbehaving agents.')
+arg_parser.add_argument('--snmp-chunk-size', default=START_CHUNK, type=int, help='Number of var binds to start out with in each SNMP request. This grows for as long as larger requests are faster per var bind, and shrinks on errors or timeouts.')
+arg_parser.add_argument('--snmp-max-chunk-size', default=MAX_CHUNK, type=int, help='Maximum number of var binds to ever put in a single SNMP request. Set this equal to --snmp-chunk-size to keep it from growing. Large requests can crash older ILOs.')
+arg_parser.add_argument('--snmp-timeout', default=1, type=float, help='Seconds to wait for an answer to each SNMP request before sending it again.')
+arg_parser.add_argument('--snmp-retries', default=5, type=int, help='Number of times to send an SNMP request again when it gets no answer in time.')
+arg_parser.add_argument('--circuit-threshold', default=DEFAULT_THRESHOLD, type=int, help='Number of SNMP or https requests to an ILO in a row that can go unanswered before it counts as down. While down, scrapes of it fail right away instead of waiting out every timeout, and a single cheap request checks whether it is back after --circuit-backoff. Set to 0 to always keep asking.')
+arg_parser.add_argument('--circuit-backoff', default=DEFAULT_BACKOFF, type=float, help='Seconds to wait before checking whether an ILO that is down answers again. This doubles every time it still does not, up to --circuit-max-backoff.')
+arg_parser.add_argument('--circuit-max-backoff', default=DEFAULT_MAX_BACKOFF, type=float, help='Longest number of seconds to wait before checking whether an ILO that is down answers again.')
+arg_parser.add_argument('--snmp-max-pdus-per-second', default=0, type=float, help='Maximum number of SNMP requests a second to send to each ILO, no matter how many scrapes, collectors or probes want something from it. Requests past that wait their turn, for up to the deadline of the scrape. Set to 0 for no limit.')
+arg_parser.add_argument('--snmp-max-var-binds-per-second', default=0, type=float, help='Maximum number of var binds a second to ask each ILO for over SNMP, counting every row asked for by GETBULK. Works like --snmp-max-pdus-per-second. Set to 0 for no limit.')
+arg_parser.add_argument('--snmp-chunk-state', help='JSON file to remember the learned chunk size of each ILO in, so they are not learned again after a restart.')
+arg_parser.add_argument('--snmp-asyncio', action='store_true', help='Send SNMP requests from a single asyncio event loop instead of a blocking SNMP engine per thread. This scales better with many ILOs on the /probe endpoint.')
+arg_parser.add_argument('--snmp-lite', action='store_true', help='Use the small built-in SNMP client instead of pysnmp to send requests. It only does what this exporter needs, with a lot less CPU per request. Incompatible with --snmp-asyncio')
+arg_parser.add_argument('--snmp-window', default=WINDOW, type=int, help='When using --snmp-asyncio, the maximum number of SNMP requests that can be waiting on a single ILO at once.')
+arg_parser.add_argument('--table-fetch', action='store_true', help='Fetch all columns of each table in one GETBULK sweep instead of separate GET requests for each column. This also rescans on every collection for free, so --scan-once is ignored when using this.')
+arg_parser.add_argument('--static-ttl', default=TTLS[STATIC], type=float, help='Seconds to cache inventory values like serial numbers and part numbers for. They are also fetched again whenever the items of a table change. Set to 0 to fetch them on every collection.')
+arg_parser.add_argument('--slow-ttl', default=TTLS[SLOW], type=float, help='Seconds to cache values that rarely change, like thresholds and link rates, for. Set to 0 to fetch them on every collection.')
+arg_parser.add_argument('--probe-max-targets', default=512, type=int, help='Maximum number of ILOs to keep scan state for when using the /probe endpoint. The least recently probed ILOs are forgotten first.')
 arg_parser.add_argument('-o', '--scan-once', action='store_true', help='Only scan for SNMP variables on init, instead of on each collection (except hard drives, see --scan-drives-once). This is a small optimization that can be used if your sever configuration never changes.')
+arg_parser.add_argument('--rescan-interval', default=600, type=float, help='Seconds between full rescans of each table. In between, the index columns of every table are read together in one GETBULK sweep to pick up any changes, which takes far fewer requests than scanning each table. Set to 0 to fully rescan on every collection.')
 arg_parser.add_argument('--scan-drives-once', action='store_true', help='When combined with --scan-once, this also prevents hard drives from being rescanned on collection. This is not recommended.')
+arg_parser.add_argument('--max-concurrency', default=3, type=int, help='Maximum number of collectors allowed to query a single ILO at the same time. Set to 1 to collect everything one after another.')
+arg_parser.add_argument('--scrape-reuse-window', default=0, type=float, help='Seconds to answer scrapes of an ILO with the results of the last scrape for, instead of asking the ILO again. Scrapes that come in while another scrape of the same ILO is going on always wait for it and share its results.')
+arg_parser.add_argument('--scrape-threads', default=32, type=int, help='Number of threads shared by all ILOs for running collectors.')
+arg_parser.add_argument('--poll', action='store_true', help='Poll each ILO in the background instead of on every scrape, and serve the last results. Probed ILOs are polled from their first probe until they are forgotten (see --probe-max-targets).')
+arg_parser.add_argument('--poll-interval', action='append', default=[], metavar='GROUP=SECONDS', help='Seconds between background polls of a group of metrics, can be given more than once. The groups are power, temperature, fan, cpu, drive and memory. Defaults to 5 for power, 15 for temperature and fan, and 300 for the rest.')
+arg_parser.add_argument('--stale-max-age', default=0, type=float, help='Seconds to keep serving the last good metrics of each collector for while an ILO is failing or too slow to finish in time, while it is tried again in the background. Set to 0 to fail the scrape instead, like before. Not used with --poll, which always serves the last poll.')
+arg_parser.add_argument('--poll-threads', default=16, type=int, help='Maximum number of background polls running at the same time, across all ILOs.')
+arg_parser.add_argument('--record', metavar='FILE', help='Record every SNMP value and HTTPS response fetched from the ILOs, and how long each request took, to a file that --replay can answer from later. This always uses the built-in SNMP client, see --snmp-lite.')
+arg_parser.add_argument('--replay', metavar='FILE', help='Answer SNMP and HTTPS requests from a file made with --record instead of asking the ILOs. ILOs that are not in the recording never answer.')
+arg_parser.add_argument('--replay-timing', action='store_true', help='When using --replay, take as long to answer each request as the recorded requests did.')
+arg_parser.add_argument('--scrape-timeout', type=float, help='Seconds a scrape is allowed to take. Prometheus sends its scrape timeout with each scrape, which is used instead if it is shorter. Collectors that run out of time are left out of the scrape instead of failing all of it, see ilo_exporter_collector_timed_out.')
+arg_parser.add_argument('--scrape-timeout-offset', default=DEFAULT_OFFSET, type=float, help='Seconds to take off of the scrape timeout, to leave time for sending the metrics back.')
 arg_parser.add_argument('-v', '--verbose', action='store_true', help='Increases verbosity. Incompatible with --quiet')
 arg_parser.add_argument('-q', '--quiet', action='store_true', help='Tells the exporter to stfu under normal operation unless there is an error/warning. Incompatible with --verbose')
 
 arg_parser.add_argument('--https-temperature', action='store_true', help='Attempt to fetch and combine additional temperature sensor info over https, such as sensor names. Requires ILO_USERNAME and ILO_PASSWORD environment variables.')
 arg_parser.add_argument('--https-fans', action='store_true', help='Attempt to fetch the fan speed of each fan in percent over https. Requires ILO_USERNAME and ILO_PASSWORD environment variables.')
 arg_parser.add_argument('--https-verify', action='store_true', help='Enable SSL verification with ILO for https requests. You can optionally specify a specific certificate to use with the ILO_CERTIFICATE environment variable.')
-arg_parser.add_argument('--https-timeout', default=5, help='Set the timeout for getting metrics over https. This sets both the connect timeout and the response timeout, meaning the actual maximum amount of allowed time is double this value, while the minimum amount of time is equal to it.')
+arg_parser.add_argument('--https-timeout', default=5, type=float, help='Set the timeout for getting metrics over https. This sets both the connect timeout and the response timeout, meaning the actual maximum amount of allowed time is double this value, while the minimum amount of time is equal to it.')
+arg_parser.add_argument('--https-max-requests-per-second', default=0, type=float, help='Maximum number of https requests a second to make to each ILO, logins included. Requests past that wait their turn, for up to the deadline of the scrape. Set to 0 for no limit.')
+arg_parser.add_argument('--https-max-connections', default=MAX_CONNECTIONS, type=int, help='Maximum number of https connections to keep open to each ILO. Connections are kept open between scrapes, and the ILO login session is reused, so most requests skip the TLS handshake and login.')
+arg_parser.add_argument('--https-deadline', default=3, type=float, help='Seconds into a scrape to wait for temperature sensor info over https, which is fetched at the same time as the SNMP values. Past this, the info fetched last time is used, and the late response is used by the next scrape.')
+arg_parser.add_argument('--https-info-ttl', default=ENDPOINT_TTLS[TEMP_ENDPOINT], type=float, help='Seconds to cache temperature sensor info fetched over https for, like sensor names and thresholds. It is also fetched again whenever the sensors found over SNMP change. Fan speeds are never cached.')
 
 
 SCAN_FAIL_COUNTER = Counter('scrape_failures', 'Number of times scraping the ILO for SNMP variables has failed.', namespace=NAMESPACE, subsystem='exporter')
@@ -59,131 +110,318 @@ def verbose(*a, **kwa):
         print(*a, **kwa)
 
 
-class BulkCollector(Collector):
-    def __init__(self, snmp_config: SnmpConfiguration, index_oid_template: str, target_name: str, scan_on_collect: bool, *metrics_groups: tuple[str, BulkValues, list[BulkEnums]], scan_method: any = scrape.detect_things):
-        self._snmp_config = snmp_config
+def scrape_failed(e: Exception):
+    print('Failed to scan SNMP, aborting collection')
+    SCAN_FAIL_COUNTER.inc()
+
+
+class BulkCollector(PlannedCollector):
+    def __init__(self, snmp_config: SnmpConfiguration, index_oid_template: str, target_name: str, scan_on_collect: bool, *metrics_groups: tuple[str, BulkValues, list[BulkEnums]], scan_method: any = scrape.detect_things, https_info: any = None, table_fetch: bool = False, rescan_interval: float = 0):
+        super().__init__(snmp_config)
         self._metrics_groups = metrics_groups
         self._target_name = target_name
+        self.group = target_name
         self._name_template = '%s_%s_' % (NAMESPACE, target_name) + '%s'
         self._ids = []
+        self._id_labels = (None, [])  # (ids, their label values)
+        self._label_sets = {}  # {metric name: (label columns, label dict of each id)}
         self._index_oid_template = index_oid_template
         self._scan_on_collect = scan_on_collect
         self._scan_method = scan_method
-
-        if not scan_on_collect:
+        self._https_info = https_info
+        self._table_fetch = table_fetch
+        self._rescan_interval = rescan_interval
+        self._last_scan = None
+        self._unchanged = False  # set when the sentinel shows nothing changed since the last scan
+
+        # every column needed, the index column first for table fetches
+        self._columns = [parse_oid(index_oid_template)]
+        self._ttls = {}  # {column: seconds its values can be cached for}
+        self._cache = ColumnCache(column_ttls)
+        for _, bulk_values, bulk_labels in metrics_groups:
+            for values in [bulk_values, *bulk_labels]:
+                if values.column is None:
+                    continue
+                if values.column not in self._columns:
+                    self._columns.append(values.column)
+
+                # a column shared by several values is only cached as long as the most volatile of them allows
+                ttl = self._cache.get_ttl(values.volatility)
+                self._ttls[values.column] = min(ttl, self._ttls.get(values.column, ttl))
+
+        if not scan_on_collect and not table_fetch:
             self.scan()
 
-    def scan(self):
+    def scan(self, deadline: Deadline | None = None):
         verbose('scanning target', self._target_name)
-        self._ids = self._scan_method(self._snmp_config, self._index_oid_template)
+        self._set_ids(self._scan_method(self._snmp_config, self._index_oid_template, deadline))
+        self._last_scan = time.monotonic()
+
+    @staticmethod
+    def _get_ids(rows: dict) -> list:
+        # the rows of the index column are the ids, same as scrape.detect_complex (or detect_things for single numbers)
+        return [index[0] if len(index) == 1 else index for index in rows]
+
+    def _set_ids(self, ids: list):
+        changed = ids != self._ids
+        self._ids = ids
+        self._snmp_config.stats.set_items(self._target_name, len(ids))
         noisy('found', len(self._ids), 'items for target', self._target_name)
+        if self._https_info is not None:
+            if changed:
+                self._https_info.invalidate()  # the items changed, so the info could have too
+            self._https_info.start()
+
+    def _get_uncached_columns(self) -> list[tuple[int]]:
+        return [column for column in self._columns[1:] if not self._cache.is_cached(column, self._ids)]
+
+    def _fetch_table(self, deadline: Deadline | None) -> dict:
+        verbose('fetching table for target', self._target_name)
+        table = snmp_table(self._snmp_config, self._columns[0], *self._get_uncached_columns(), deadline=deadline)
+
+        self._set_ids(self._get_ids(table[self._columns[0]]))
+
+        # the cached columns are no good if the rows changed
+        missing = [column for column in self._get_uncached_columns() if column not in table]
+        if missing:
+            table.update(snmp_table(self._snmp_config, *missing, deadline=deadline))
+        return table
+
+    def start(self):
+        scanning = self._table_fetch or (self._scan_on_collect and self.get_sentinel() is None)
+        if self._https_info is not None and (scanning or self._https_info.missing):
+            self._https_info.start()  # a scan is coming, or the last fetch didn't get anything
+
+    def get_sentinel(self) -> tuple[int] | None:
+        if self._table_fetch or not self._scan_on_collect or self._last_scan is None:
+            return None
+        if time.monotonic() - self._last_scan >= self._rescan_interval:
+            return None  # time for a full rescan
+        return self._columns[0]
+
+    def check_sentinel(self, rows: dict | None):
+        if rows is None:
+            return  # can't tell, so scan
+
+        ids = self._get_ids(rows)
+        if ids != self._ids:
+            verbose('items changed for target', self._target_name)
+            self._set_ids(ids)
+        self._unchanged = True
+
+    def prepare(self, deadline: Deadline | None = None) -> dict | None:
+        if self._table_fetch:
+            return self._fetch_table(deadline)
+        elif self._scan_on_collect and not self._unchanged:
+            self.scan(deadline)
+        self._unchanged = False
+        return None
+
+    def plan(self, request_plan: RequestPlan):
+        for column in self._get_uncached_columns():
+            request_plan.add(column, self._ids)
+
+    def build(self, values: dict, deadline: Deadline | None = None):
+        ids = self._ids
+        values = self._cache.update(values, self._ttls, ids)
+        if self._https_info is not None:
+            self._https_info.apply(ids, deadline)
+        if self._id_labels[0] is not ids:
+            self._id_labels = (ids, [str(i) for i in ids])
+
+        # the labels are kept in the frame since they may be reused
+        frame = TableFrame(ids)
+        frame.add('id', self._id_labels[1])
+
+        for documentation, bulk_values, bulk_labels in self._metrics_groups:
+            metric_name = self._name_template % bulk_values.name
+            verbose('collecting', metric_name)
+
+            label_names = ['id']
+            for label in bulk_labels:
+                if label.name not in frame.columns:
+                    frame.add(label.name, label.read_labels(values, ids))
+                label_names.append(label.name)
+
+            # the label sets are only made again when some label changed
+            label_columns = [frame.columns[name] for name in label_names]
+            cached = self._label_sets.get(metric_name)
+            if cached is None or cached[0] != label_columns:
+                cached = (label_columns, [dict(zip(label_names, labels)) for labels in zip(*label_columns)])
+                self._label_sets[metric_name] = cached
+            label_sets = cached[1]
+
+            metric = GaugeMetricFamily(
+                metric_name,
+                documentation,
+                labels=label_names
+            )
+
+            # values are not reused
+            value_column = bulk_values.read_column(values, ids)
+
+            # map everything
+            for value, labels in zip(value_column, label_sets):
+                if value is None:
+                    print('missing value! metric:', metric_name, 'id:', labels['id'])
+                    value = math.nan
+                metric.samples.append(Sample(metric_name, labels, value))
 
-    def collect(self):
-        cache = {}
+            yield metric
 
-        try:
-            if self._scan_on_collect:
-                self.scan()
-
-            for documentation, bulk_values, bulk_labels in self._metrics_groups:
-                metric_name = self._name_template % bulk_values.name
-                verbose('collecting', metric_name)
-
-                label_names = ['id']
-                label_maps = []
-
-                for label in bulk_labels:
-                    # the labels are cached since they may be reused
-                    if label.name not in cache:
-                        cache[label.name] = label.get_values(self._snmp_config, self._ids)
-                    label_names.append(label.name)
-                    label_maps.append(cache[label.name])
-
-                metric = GaugeMetricFamily(
-                    metric_name,
-                    documentation,
-                    labels=label_names
-                )
-
-                # values are not reused
-                value_map = bulk_values.get_values(self._snmp_config, self._ids)
-
-                # map everything
-                for i in self._ids:
-                    labels = [str(i)]  # id is first
-                    for label_map in label_maps:
-                        label_value = label_map[i]
-                        labels.append(str(label_value))
-
-                    value = value_map.get(i)
-                    if value is None:
-                        print('missing value! metric:', metric_name, 'id:', i)
-                        value = 'nan'
-                    metric.add_metric(labels, value)
-
-                yield metric
+    def failed(self, e: Exception):
+        scrape_failed(e)
 
-        except Exception as e:
-            print('Failed to scan SNMP, aborting collection')
-            SCAN_FAIL_COUNTER.inc()
-            raise e
 
+class PowerCollector(PlannedCollector):
+    group = 'power'
 
-class PowerCollector(Collector):
-    def collect(self) -> float:
+    def __init__(self, snmp_config: SnmpConfiguration):
+        super().__init__(snmp_config)
+        self._reading_oid = parse_oid(POWER_METER_READING)
+        self._support_oid = parse_oid(POWER_METER_SUPPORT)
+        self._status_oid = parse_oid(POWER_METER_STATUS)
+
+    def plan(self, request_plan: RequestPlan):
+        for oid in [self._reading_oid, self._support_oid, self._status_oid]:
+            request_plan.add(oid, [()])
+
+    def build(self, values: dict, deadline: Deadline | None = None):
         verbose('collecting ilo_server_power_draw')
-        try:
-            reading = snmp_get(config, POWER_METER_READING)
-            support = snmp_get(config, POWER_METER_SUPPORT)
-            status = snmp_get(config, POWER_METER_STATUS)
-
-            if not isinstance(reading, int):
-                print('expected power meter reading to be an int, got', type(reading))
-                print('value in question:', reading)
-                reading = -1
-            if not isinstance(support, int):
-                print('expected power meter support to be an int, got', type(support))
-                print('value in question:', support)
-                support = 1
-            if not isinstance(status, int):
-                print('expected power meter status to be an int, got', type(status))
-                print('value in question:', status)
-                status = 1
-
-            if support not in POWER_METER_SUPPORT_MAP:
-                print('ILO returned a value outside of the expected range for POWER_METER_SUPPORT:', support)
-                support_s = 'unknown'
-            else:
-                support_s = POWER_METER_SUPPORT_MAP[support]
-            if status not in POWER_METER_STATUS_MAP:
-                print('ILO returned a value outside of the expected range for POWER_METER_STATUS:', status)
-                status_s = 'unknown'
-            else:
-                status_s = POWER_METER_STATUS_MAP[status]
+        reading = values.get(self._reading_oid, {}).get(())
+        support = values.get(self._support_oid, {}).get(())
+        status = values.get(self._status_oid, {}).get(())
+
+        if not isinstance(reading, int):
+            print('expected power meter reading to be an int, got', type(reading))
+            print('value in question:', reading)
+            reading = -1
+        if not isinstance(support, int):
+            print('expected power meter support to be an int, got', type(support))
+            print('value in question:', support)
+            support = 1
+        if not isinstance(status, int):
+            print('expected power meter status to be an int, got', type(status))
+            print('value in question:', status)
+            status = 1
+
+        if support not in POWER_METER_SUPPORT_MAP:
+            print('ILO returned a value outside of the expected range for POWER_METER_SUPPORT:', support)
+            support_s = 'unknown'
+        else:
+            support_s = POWER_METER_SUPPORT_MAP[support]
+        if status not in POWER_METER_STATUS_MAP:
+            print('ILO returned a value outside of the expected range for POWER_METER_STATUS:', status)
+            status_s = 'unknown'
+        else:
+            status_s = POWER_METER_STATUS_MAP[status]
 
-            metric = GaugeMetricFamily('ilo_server_power_draw', 'Power draw of the server in watts', labels=['support', 'status'])
-            metric.add_metric([support_s, status_s], reading)
-            yield metric
-        except Exception as e:
-            print('Failed to scan SNMP, aborting collection')
-            SCAN_FAIL_COUNTER.inc()
-            raise e
+        metric = GaugeMetricFamily('ilo_server_power_draw', 'Power draw of the server in watts', labels=['support', 'status'])
+        metric.add_metric([support_s, status_s], reading)
+        yield metric
+
+    def failed(self, e: Exception):
+        scrape_failed(e)
+
+
+class TemperatureSensorInfo(object):
+    """
+    Fetches the extra temperature sensor info over https in the background, starting as soon as a scrape knows it
+    needs it, so it happens at the same time as the SNMP requests instead of after them. If it isn't back by the
+    deadline (or the deadline of the scrape, if that's sooner), the last info fetched is used instead of waiting, and
+    the late fetch is picked up by a later scrape. Until a fetch gets something, every scrape tries again.
+    """
+    def __init__(self, https_config: HttpsConfiguration, stats: ScrapeStats, executor: ThreadPoolExecutor, deadline: float):
+        self._https_config = https_config
+        self._stats = stats
+        self._executor = executor
+        self._deadline = deadline
+        self._future = None
+        self._started = None
+        self._info = {}  # {sensor: {name: value}} from the last fetch that worked
+        self._failed = False  # whether the last fetch failed
+        self._lock = threading.Lock()
+
+        self.label = BulkPredeterminedValues('label')
+        self.x_pos = BulkPredeterminedValues('x_pos')
+        self.y_pos = BulkPredeterminedValues('y_pos')
+        self.caution_threshold = BulkPredeterminedValues('threshold_caution')
+        self.critical_threshold = BulkPredeterminedValues('threshold_critical')
+
+    def _fetch(self) -> dict:
+        with self._stats.phase('temperature', 'https'):
+            return scrape.get_temp_sensor_info(self._https_config)
+
+    def invalidate(self):
+        self._https_config.session.invalidate(TEMP_ENDPOINT)
+
+    @property
+    def missing(self) -> bool:
+        """ whether the last fetch failed or there's nothing fetched yet, so it should be tried again """
+        return self._failed or len(self._info) == 0
+
+    def start(self):
+        """ starts a fetch, unless one is already going. fetches are cheap when the info is still cached """
+        with self._lock:
+            if self._future is None:
+                self._started = time.monotonic()
+                self._future = self._executor.submit(self._fetch)
+
+    def apply(self, sensors: list[int], scrape_deadline: Deadline | None = None):
+        """ waits for the fetch until the deadline, then sets the values of each sensor """
+        with self._lock:
+            future, started = self._future, self._started
+
+        if future is not None:
+            try:
+                self._info = future.result(timeout=max(0.0, time_left(scrape_deadline, started + self._deadline - time.monotonic())))
+                self._failed = False
+                with self._lock:
+                    self._future = None
+            except TimeoutError:
+                print('temperature sensor info over HTTPS is late, using what was fetched before')
+            except Exception as e:
+                print('failed to fetch additional temperature sensor data over HTTPS')
+                HTTPS_FAIL_COUNTER.inc()
+                if isinstance(e, CircuitOpenError):
+                    print(e)  # the traceback wouldn't say anything new
+                else:
+                    traceback.print_exception(e)
+                self._failed = True
+                with self._lock:
+                    self._future = None
+
+        label_map = self._info
+        self.label.values = {sensor: label_map.get(sensor, {}).get('label', 'unknown') for sensor in sensors}
+        self.x_pos.values = {sensor: label_map.get(sensor, {}).get('xposition', '-1') for sensor in sensors}
+        self.y_pos.values = {sensor: label_map.get(sensor, {}).get('yposition', '-1') for sensor in sensors}
+        self.caution_threshold.values = {sensor: label_map.get(sensor, {}).get('caution', -1) for sensor in sensors}
+        self.critical_threshold.values = {sensor: label_map.get(sensor, {}).get('critical', -1) for sensor in sensors}
 
 
 class FanSpeedCollector(Collector):
-    def __init__(self, https_config: HttpsConfiguration):
+    group = 'fan'
+
+    def __init__(self, https_config: HttpsConfiguration, stats: ScrapeStats):
         self._https_config = https_config
+        self._stats = stats
 
     def collect(self) -> float:
         verbose('collecting ilo_fan_speed')
         try:
             metric = GaugeMetricFamily('ilo_fan_speed', 'Detailed fan speed as returned from the ILO over https', labels=['id', 'units'])
-            fan_speeds = scrape.get_fan_speeds(self._https_config)
+            with self._stats.phase(self.group, 'https'):
+                fan_speeds = scrape.get_fan_speeds(self._https_config, current_deadline())
             for fan in fan_speeds:
                 speed, units = fan_speeds[fan]
                 metric.add_metric([str(fan), units], speed)
 
             yield metric
+        except DeadlineExceeded as e:
+            raise e  # not a failure, the scrape just ran out of time
+        except CircuitOpenError as e:
+            print('Failed to fetch fan speed:', e)
+            SCAN_FAIL_COUNTER.inc()
         except Exception as e:
             #
             print('Failed to fetch fan speed')
@@ -191,110 +429,89 @@ class FanSpeedCollector(Collector):
             SCAN_FAIL_COUNTER.inc()
 
 
-if __name__ == '__main__':
+args = None
+engines = EnginePool()
+chunk_size_store = None
+scrape_executor = None
+poll_scheduler = None
+poll_intervals = None
+column_ttls = TTLS
+using_https = False
+https_user = None
+https_pass = None
+ssl_verify = None
+
+
+def create_snmp_config(host: str, port: int, community: str) -> SnmpConfiguration:
+    target = '%s:%i' % (host, port)
+    size = args.snmp_chunk_size
+    on_change = None
+    if chunk_size_store is not None:
+        size = chunk_size_store.get(target) or size
+        on_change = lambda new_size: chunk_size_store.put(target, new_size)
+
+    return SnmpConfiguration(
+        engines,
+        CommunityData(community),
+        UdpTransportTarget((host, port), timeout=args.snmp_timeout, retries=args.snmp_retries),
+        ContextData(),
+        args.snmp_max_repetitions,
+        AdaptiveChunkSize(size, MIN_CHUNK, args.snmp_max_chunk_size, on_change),
+        create_breaker('SNMP on %s' % target, parse_oid(POWER_METER_SUPPORT)),
+        create_bucket(args.snmp_max_pdus_per_second),
+        create_bucket(args.snmp_max_var_binds_per_second),
+    )
 
-    args = arg_parser.parse_args()
 
-    # validate args
-    if args.quiet and args.verbose:
-        print('--quiet and --verbose do not mix')
-        exit(1)
+def create_breaker(name: str, probe_oid: tuple[int] | None = None) -> CircuitBreaker | None:
+    if args.circuit_threshold < 1:
+        return None
+    return CircuitBreaker(name, args.circuit_threshold, args.circuit_backoff, args.circuit_max_backoff, probe_oid)
 
-    using_https = args.https_temperature or args.https_fans
-    if using_https:
-        https_user = os.getenv('ILO_USERNAME')
-        https_pass = os.getenv('ILO_PASSWORD')
-        if https_user is None or https_pass is None:
-            print('Fetching values over https requires setting the ILO_USERNAME and ILO_PASSWORD environment variables.')
-            exit(1)
 
-        if args.https_verify:
-            ssl_cert = os.getenv('ILO_CERTIFICATE')
-            if ssl_cert is not None:
-                ssl_verify = ssl_cert
-            else:
-                ssl_verify = True  # use system certificates
-        else:
-            ssl_verify = False
-            # disable insecure request warning if not verifying requests. Instead, give a single warning at init
-            from urllib3 import disable_warnings
-            from urllib3.exceptions import InsecureRequestWarning
+def create_bucket(rate: float) -> TokenBucket | None:
+    """ allows bursts of up to a second's worth """
+    if rate <= 0:
+        return None
+    return TokenBucket(rate)
 
-            disable_warnings(InsecureRequestWarning)
-            print('Warning! Not verifying SSL certificate for https requests to the ILO.')
-    else:
-        https_user = None
-        https_pass = None
-        ssl_verify = None
 
-    # init everything
-    config = SnmpConfiguration(
-        SnmpEngine(),
-        CommunityData(args.snmp_community),
-        UdpTransportTarget((args.ilo_address, args.snmp_port)),
-        ContextData(),
+def create_https_config(host: str, stats: ScrapeStats | None = None) -> HttpsConfiguration | None:
+    if not using_https:
+        return None
+
+    return HttpsConfiguration(
+        host,
+        https_user,
+        https_pass,
+        ssl_verify,
+        args.https_timeout,
+        engines if isinstance(engines, (RecordingEngine, ReplayEngine)) else None,
+        stats,
+        args.https_max_connections,
+        {**ENDPOINT_TTLS, TEMP_ENDPOINT: args.https_info_ttl},
+        create_breaker('HTTPS on %s' % host),
+        create_bucket(args.https_max_requests_per_second),
     )
 
-    if using_https:
-        https_config = HttpsConfiguration(
-            args.ilo_address,
-            https_user,
-            https_pass,
-            ssl_verify,
-            args.https_timeout
-        )
-        HTTPS_FAIL_COUNTER = Counter('https_failures', 'Number of times scraping the ILO over HTTPS has failed.', namespace=NAMESPACE, subsystem='exporter')
-    else:
-        https_config = None
 
-    REGISTRY.register(PowerCollector())
+def create_collectors(config: SnmpConfiguration, https_config: HttpsConfiguration | None) -> list[Collector]:
+    collectors = [PowerCollector(config)]
 
     no_value = BulkDummyValue('info')
 
     https_temp_labels = []
     https_temp_groups = []
-    temp_scan_method = scrape.detect_things
+    temp_info = None
     if args.https_temperature:
-        temp_label = BulkPredeterminedValues('label')
-        temp_x_pos = BulkPredeterminedValues('x_pos')
-        temp_y_pos = BulkPredeterminedValues('y_pos')
-        https_temp_labels = [temp_label, temp_x_pos, temp_y_pos]
-
-        temp_caution_threshold = BulkPredeterminedValues('threshold_caution')
-        temp_critical_threshold = BulkPredeterminedValues('threshold_critical')
+        temp_info = TemperatureSensorInfo(https_config, config.stats, scrape_executor, args.https_deadline)
+        https_temp_labels = [temp_info.label, temp_info.x_pos, temp_info.y_pos]
         https_temp_groups = [
-            ('Temperature caution thresholds for each temperature sensor in celsius as returned by the ILO over HTTPS', temp_caution_threshold, []),
-            ('Temperature critical thresholds for each temperature sensor in celsius as returned by the ILO over HTTPS', temp_critical_threshold, []),
+            ('Temperature caution thresholds for each temperature sensor in celsius as returned by the ILO over HTTPS', temp_info.caution_threshold, []),
+            ('Temperature critical thresholds for each temperature sensor in celsius as returned by the ILO over HTTPS', temp_info.critical_threshold, []),
         ]
 
-        def scan_temperature_info(c: SnmpConfiguration, base_oid: str):
-            sensors = scrape.detect_things(c, base_oid)
-            try:
-                # clear old mappings
-                temp_label.values = {}
-                temp_x_pos.values = {}
-                temp_y_pos.values = {}
-                temp_caution_threshold.values = {}
-                temp_critical_threshold.values = {}
-
-                # get new mappings
-                label_map = scrape.get_temp_sensor_info(https_config)
-                for sensor in sensors:
-                    labels = label_map.get(sensor, {})
-                    temp_label.values[sensor] = labels.get('label', 'unknown')
-                    temp_x_pos.values[sensor] = labels.get('xposition', '-1')
-                    temp_y_pos.values[sensor] = labels.get('yposition', '-1')
-                    temp_caution_threshold.values[sensor] = labels.get('caution', -1)
-                    temp_critical_threshold.values[sensor] = labels.get('critical', -1)
-            except Exception as e:
-                print('failed to fetch additional temperature sensor data over HTTPS')
-                HTTPS_FAIL_COUNTER.inc()
-                traceback.print_exception(e)
-            return sensors
-
-        temp_scan_method = scan_temperature_info
-
-    REGISTRY.register(BulkCollector(
+    collectors.append(BulkCollector(
         config,
         TEMP_INDEX,
         'temperature',
@@ -303,22 +520,26 @@ if __name__ == '__main__':
         ('Temperatures readings of each temperature sensor in celsius', TEMP_CELSIUS, []),
         ('Temperature thresholds for each temperature sensor in celsius', TEMP_THRESHOLD, []),
         *https_temp_groups,
-        scan_method=temp_scan_method
+        https_info=temp_info,
+        table_fetch=args.table_fetch,
+        rescan_interval=args.rescan_interval,
     ))
 
-    REGISTRY.register(BulkCollector(
+    collectors.append(BulkCollector(
         config,
         FAN_INDEX,
         'fan',
         not args.scan_once,
         ('Information about system fans', no_value, [FAN_LOCALE, FAN_CONDITION, FAN_SPEED, FAN_PRESENT, FAN_PRESENCE_TEST]),
+        table_fetch=args.table_fetch,
+        rescan_interval=args.rescan_interval,
     ))
 
     # enhanced fan metrics over https
     if args.https_fans:
-        REGISTRY.register(FanSpeedCollector(https_config))
+        collectors.append(FanSpeedCollector(https_config, config.stats))
 
-    REGISTRY.register(BulkCollector(
+    collectors.append(BulkCollector(
         config,
         CPU_INDEX,
         'cpu',
@@ -328,11 +549,13 @@ if __name__ == '__main__':
         ('CPU step', CPU_STEP, []),     # revision?
         ('Number of enabled cores', CORES_ENABLED, []),
         ('Number of available threads', THREADS_AVAILABLE, []),
+        table_fetch=args.table_fetch,
+        rescan_interval=args.rescan_interval,
     ))
 
     # logical drives are for v2 if it ever exists (I don't use logical drives, sorry)
 
-    REGISTRY.register(BulkCollector(
+    collectors.append(BulkCollector(
         config,
         DRIVE_INDEX,
         'drive',
@@ -344,22 +567,189 @@ if __name__ == '__main__':
         ('Maximum temperatures of installed drives in celsius', DRIVE_TEMP_MAX, []),
         ('Reference time of installed drives in hours', DRIVE_REFERENCE_TIME, []),
         scan_method=scrape.detect_complex,
+        table_fetch=args.table_fetch,
+        rescan_interval=args.rescan_interval,
     ))
 
-    REGISTRY.register(BulkCollector(
+    collectors.append(BulkCollector(
         config,
         MEMORY_INDEX,
         'memory',
         not args.scan_once,
         ('Information about system memory', no_value, [MEMORY_LOCATION, MEMORY_MANUFACTURER, MEMORY_PART_NUMBER, MEMORY_STATUS, MEMORY_CONDITION]),
         ('Sizes of system memory modules in kilobytes', MEMORY_SIZE, []),
+        table_fetch=args.table_fetch,
+        rescan_interval=args.rescan_interval,
     ))
 
+    return collectors
+
+
+def create_target_collector(host: str, port: int, community: str) -> Collector:
+    snmp_config = create_snmp_config(host, port, community)
+    orchestrator = ScrapeOrchestrator(
+        snmp_config,
+        create_collectors(snmp_config, create_https_config(host, snmp_config.stats)),
+        scrape_executor,
+        args.max_concurrency,
+        on_failure=scrape_failed,
+        reuse_window=args.scrape_reuse_window,
+    )
+    if poll_scheduler is None:
+        if args.stale_max_age > 0:
+            return StaleWhileRevalidate(orchestrator, args.stale_max_age)
+        return orchestrator
+
+    poller = BackgroundPoller(orchestrator, poll_intervals)
+    poll_scheduler.add(poller)
+    return poller
+
+
+def init(parsed_args: argparse.Namespace):
+    """ validates the args and sets up everything the collectors need, exiting on bad args """
+    global args, poll_intervals, using_https, https_user, https_pass, ssl_verify, column_ttls, engines, chunk_size_store, HTTPS_FAIL_COUNTER, scrape_executor, poll_scheduler
+    args = parsed_args
+
+    # validate args
+    if args.quiet and args.verbose:
+        print('--quiet and --verbose do not mix')
+        exit(1)
+
+    if args.max_concurrency < 1:
+        print('--max-concurrency must be at least 1')
+        exit(1)
+
+    try:
+        poll_intervals = parse_intervals(args.poll_interval)
+    except ValueError as e:
+        print('bad --poll-interval:', e)
+        exit(1)
+
+    if args.snmp_asyncio and args.snmp_lite:
+        print('--snmp-asyncio and --snmp-lite do not mix')
+        exit(1)
+
+    if args.record is not None and (args.replay is not None or args.snmp_asyncio):
+        print('--record does not mix with --replay or --snmp-asyncio')
+        exit(1)
+
+    if args.snmp_timeout <= 0 or args.snmp_retries < 0:
+        print('--snmp-timeout must be more than 0, and --snmp-retries can not be negative')
+        exit(1)
+
+    if args.circuit_backoff <= 0 or args.circuit_max_backoff < args.circuit_backoff:
+        print('--circuit-backoff must be more than 0, and no more than --circuit-max-backoff')
+        exit(1)
+
+    if args.snmp_max_pdus_per_second < 0 or args.snmp_max_var_binds_per_second < 0 or args.https_max_requests_per_second < 0:
+        print('rate limits can not be negative')
+        exit(1)
+
+    if args.scrape_reuse_window < 0:
+        print('--scrape-reuse-window can not be negative')
+        exit(1)
+
+    if args.stale_max_age < 0:
+        print('--stale-max-age can not be negative')
+        exit(1)
+
+    if args.scrape_timeout is not None and args.scrape_timeout <= 0:
+        print('--scrape-timeout must be more than 0')
+        exit(1)
+
+    if args.https_max_connections < 1:
+        print('--https-max-connections must be at least 1')
+        exit(1)
+
+    if args.snmp_window < 1:
+        print('--snmp-window must be at least 1')
+        exit(1)
+
+    if args.snmp_chunk_size < MIN_CHUNK or args.snmp_max_chunk_size < args.snmp_chunk_size:
+        print('--snmp-chunk-size must be at least %i, and no larger than --snmp-max-chunk-size' % MIN_CHUNK)
+        exit(1)
+
+    using_https = args.https_temperature or args.https_fans
+    if using_https and args.replay is not None:
+        https_user = None  # the recording doesn't need them
+        https_pass = None
+        ssl_verify = None
+    elif using_https:
+        https_user = os.getenv('ILO_USERNAME')
+        https_pass = os.getenv('ILO_PASSWORD')
+        if https_user is None or https_pass is None:
+            print('Fetching values over https requires setting the ILO_USERNAME and ILO_PASSWORD environment variables.')
+            exit(1)
+
+        if args.https_verify:
+            ssl_cert = os.getenv('ILO_CERTIFICATE')
+            if ssl_cert is not None:
+                ssl_verify = ssl_cert
+            else:
+                ssl_verify = True  # use system certificates
+        else:
+            ssl_verify = False
+            # disable insecure request warning if not verifying requests. Instead, give a single warning at init
+            from urllib3 import disable_warnings
+            from urllib3.exceptions import InsecureRequestWarning
+
+            disable_warnings(InsecureRequestWarning)
+            print('Warning! Not verifying SSL certificate for https requests to the ILO.')
+    else:
+        https_user = None
+        https_pass = None
+        ssl_verify = None
+
+    # init everything
+    column_ttls = {**TTLS, STATIC: args.static_ttl, SLOW: args.slow_ttl}
+
+    if args.replay is not None:
+        try:
+            engines = ReplayEngine(Session(args.replay), args.replay_timing)
+        except (OSError, ValueError) as e:
+            print('failed to load recording:', e)
+            exit(1)
+    elif args.record is not None:
+        engines = RecordingEngine(SessionRecorder(args.record))
+    elif args.snmp_asyncio:
+        engines = AsyncEngine(args.snmp_window)
+    elif args.snmp_lite:
+        engines = LiteEngine()
+    else:
+        engines = EnginePool()
+
+    if args.snmp_chunk_state is not None:
+        chunk_size_store = ChunkSizeStore(args.snmp_chunk_state)
+
+    if using_https:
+        HTTPS_FAIL_COUNTER = Counter('https_failures', 'Number of times scraping the ILO over HTTPS has failed.', namespace=NAMESPACE, subsystem='exporter')
+
+    scrape_executor = ThreadPoolExecutor(max_workers=args.scrape_threads, thread_name_prefix='scrape')
+    if args.poll:
+        poll_scheduler = PollScheduler(args.poll_threads)
+
+
+if __name__ == '__main__':
+    init(arg_parser.parse_args())
+
+    if args.ilo_address is not None:
+        REGISTRY.register(create_target_collector(args.ilo_address, args.snmp_port, args.snmp_community))
+    else:
+        print('no ILO address given, only serving the /probe endpoint')
+
+    probe_targets = ProbeTargets(
+        lambda target: [create_target_collector(target.host, target.port, target.community)],
+        args.probe_max_targets,
+        on_forget=lambda collector: collector.stop() if isinstance(collector, BackgroundPoller) else None,
+    )
+    budget = ScrapeBudget(args.scrape_timeout, args.scrape_timeout_offset)
+    app = make_probe_app(probe_targets, make_cached_wsgi_app(REGISTRY, budget), args.snmp_port, args.snmp_community, budget)
+
     # start metrics endpoint
     addr = args.server_address
     port = args.server_port
     print('starting metrics server on http://%s:%s' % (addr, port))
-    server, thread = start_http_server(port, addr)
+    server, thread = start_probe_server(port, addr, app)
     print('ready!')
 
     thread.join()
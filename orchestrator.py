@@ -0,0 +1,336 @@
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from snmp import SnmpConfiguration, RequestPlan, snmp_table, snmp_get
+from instrumentation import get_collector_name
+from deadline import Deadline, DeadlineExceeded, current_deadline, deadline_scope, time_left
+
+from concurrent.futures import Executor, Future, TimeoutError, FIRST_COMPLETED, wait
+import threading
+import time
+
+# share of the time left in a scrape after which the collectors that are ready get fetched without waiting on the rest.
+# the sentinel sweep gets the same share
+FETCH_AFTER = 0.5
+
+
+class PlannedCollector(Collector):
+    """
+    A collector whose SNMP GETs can be planned together with those of other collectors. A collection happens in three
+    steps: prepare() does anything that has to happen first (like scanning), plan() adds the wanted values to a
+    RequestPlan, then build() turns the fetched values into metrics.
+    Before that, the rows of the column given by get_sentinel() are read and passed to check_sentinel(), so a collector
+    can tell whether anything changed without scanning. The sentinels of every collector are read in the same sweep.
+    prepare() and build() get the deadline of the scrape, if it has one, see deadline.py.
+    When collected by itself, it gets a RequestPlan of its own.
+    """
+    def __init__(self, snmp_config: SnmpConfiguration):
+        self._snmp_config = snmp_config
+
+    def start(self):
+        """ called first thing in a collection, to start anything slow that doesn't need SNMP, like https requests """
+        pass
+
+    def get_sentinel(self) -> tuple[int] | None:
+        """ returns a column to read before prepare(), or None to skip it """
+        return None
+
+    def check_sentinel(self, rows: dict[tuple[int], any] | None):
+        """ gets the rows read for get_sentinel(), or None if they couldn't be read """
+        pass
+
+    def prepare(self, deadline: Deadline | None = None) -> dict | None:
+        """ returns the values to build with if they were already fetched, in which case plan() is skipped """
+        return None
+
+    def plan(self, request_plan: RequestPlan):
+        raise NotImplementedError()
+
+    def build(self, values: dict, deadline: Deadline | None = None):
+        raise NotImplementedError()
+
+    def failed(self, e: Exception):
+        pass
+
+    def timed_prepare(self, deadline: Deadline | None = None) -> tuple[dict | None, float]:
+        """ prepare(), timed as the scan phase. also returns how long it took """
+        start = time.monotonic()
+        values = self.prepare(deadline)
+        seconds = time.monotonic() - start
+        self._snmp_config.stats.observe_phase(get_collector_name(self), 'scan', seconds)
+        return values, seconds
+
+    def timed_build(self, values: dict, prepare_seconds: float, deadline: Deadline | None = None) -> list:
+        """ build(), timed as the build phase. the collector's time is counted here, since this is the last phase """
+        start = time.monotonic()
+        families = list(self.build(values, deadline))
+        seconds = time.monotonic() - start
+        name = get_collector_name(self)
+        self._snmp_config.stats.observe_phase(name, 'build', seconds)
+        self._snmp_config.stats.observe_collector(name, prepare_seconds + seconds)
+        return families
+
+    def collect(self):
+        deadline = current_deadline()
+        try:
+            self.start()
+            check_sentinels(self._snmp_config, [self], deadline)
+            values, prepare_seconds = self.timed_prepare(deadline)
+            if values is None:
+                request_plan = RequestPlan()
+                self.plan(request_plan)
+                with self._snmp_config.stats.phase('shared', 'fetch'):
+                    values = request_plan.execute(self._snmp_config, deadline=deadline)
+
+            yield from self.timed_build(values, prepare_seconds, deadline)
+        except Exception as e:
+            self.failed(e)
+            raise e
+
+
+def check_sentinels(snmp_config: SnmpConfiguration, collectors: list[PlannedCollector], deadline: Deadline | None = None):
+    """ reads the sentinels of every collector in a single GETBULK sweep, see PlannedCollector """
+    if snmp_config.max_repetitions < 1:
+        return  # GETBULK isn't working, so just scan
+
+    sentinels = {}
+    for collector in collectors:
+        column = collector.get_sentinel()
+        if column is not None:
+            sentinels[collector] = column
+    if len(sentinels) == 0:
+        return
+
+    try:
+        with snmp_config.stats.phase('shared', 'sentinel'):
+            table = snmp_table(snmp_config, *dict.fromkeys(sentinels.values()), deadline=deadline)
+    except DeadlineExceeded:
+        table = {}  # scan instead, with whatever time is left
+    except Exception as e:
+        print('failed to check for changes, scanning instead:', e)
+        table = {}
+
+    for collector, column in sentinels.items():
+        collector.check_sentinel(table.get(column))
+
+
+class ScrapeOrchestrator(Collector):
+    """
+    Runs all collectors for a single ILO at the same time, so a scrape takes about as long as the slowest collector
+    instead of all of them added together. At most max_concurrency requests hit the ILO at once, even across
+    overlapping scrapes, since the management processor is not very powerful.
+    The SNMP GETs of every PlannedCollector are packed into as few requests as possible.
+    While the ILO isn't answering, scrapes fail right away, and once it's time to check again a single GET of the probe
+    oid of the circuit breaker goes out before anything else, see CircuitBreaker.
+    The metric families are yielded in the same order as the collectors were given.
+    With a deadline, collectors that can't finish in time are given up on, and the rest are still returned. Whether
+    each collector made it is kept in the stats of the ILO. So a slow scan can't hold up everyone else, the collectors
+    that are prepared by FETCH_AFTER of the time left are fetched and built without waiting on the rest, and the rest
+    are each fetched as soon as they're prepared. Without a deadline, everything is fetched together.
+    scrape() can collect just some of the collectors, which is what the background poller uses. scrape_all() collects
+    all of them, sharing a scrape that's already going with anyone else who asks at the same time, and reusing its
+    results for reuse_window seconds after it's done.
+    """
+    def __init__(self, snmp_config: SnmpConfiguration, collectors: list[Collector], executor: Executor, max_concurrency: int, on_failure: any = None, reuse_window: float = 0):
+        self._snmp_config = snmp_config
+        self._collectors = collectors
+        self._executor = executor
+        self._slots = threading.Semaphore(max_concurrency)
+        self._on_failure = on_failure
+        self._reuse_window = reuse_window
+        self._last_pdu_count = 0
+        self._in_flight = None  # Future of the scrape_all() going on, if any
+        self._last_results = (None, 0)  # (results of the last scrape_all() that worked, when it finished)
+        self._flight_lock = threading.Lock()
+
+    def _run(self, function, *a):
+        with self._slots:
+            return function(*a)
+
+    def _map(self, function, items: list) -> list:
+        futures = [self._executor.submit(self._run, function, item) for item in items]
+        return [future.result() for future in futures]
+
+    @property
+    def collectors(self) -> list[Collector]:
+        return self._collectors
+
+    @property
+    def target(self) -> str:
+        return self._snmp_config.target
+
+    def _check_circuit(self, deadline: Deadline | None):
+        """ raises CircuitOpenError if the ILO isn't answering, or probes it if it's time to check again """
+        breaker = self._snmp_config.breaker
+        if breaker is not None and breaker.check_scrape() and breaker.probe_oid is not None:
+            snmp_get(self._snmp_config, breaker.probe_oid, deadline)
+
+    def _prepare(self, collector: PlannedCollector, deadline: Deadline | None) -> tuple[dict | None, float] | None:
+        """ timed_prepare(), or None if it ran out of time """
+        try:
+            return collector.timed_prepare(deadline)
+        except DeadlineExceeded:
+            return None
+
+    def _prepare_all(self, collectors: list[PlannedCollector], deadline: Deadline | None, cutoff: Deadline | None):
+        """
+        prepares the collectors at the same time, and yields each batch of them that's ready to fetch as
+        {collector: timed_prepare() result}. the first batch is everything prepared by the cutoff, then each one after
+        that as it finishes. stops at the deadline
+        """
+        pending = {self._executor.submit(self._run, self._prepare, collector, deadline): collector for collector in collectors}
+        done, _ = wait(pending, time_left(cutoff, None))
+        while True:
+            # re-raises anything a prepare raised, failing the scrape like before
+            yield {pending.pop(future): future.result() for future in done}
+            if not pending:
+                return
+            done, _ = wait(pending, time_left(deadline, None), FIRST_COMPLETED)
+            if not done:
+                return  # out of time, the rest are left out
+
+    def _fetch_and_build(self, prepared: dict, deadline: Deadline | None) -> dict[Collector, list]:
+        """ fetches the values of the prepared collectors together, and builds each one whose values all came back """
+        plans = {}
+        request_plan = RequestPlan()
+        for collector, result in prepared.items():
+            if result is not None and result[0] is None:
+                plans[collector] = RequestPlan()
+                collector.plan(plans[collector])
+                request_plan.extend(plans[collector])
+
+        planned_values = {}
+        if len(request_plan) > 0:
+            with self._snmp_config.stats.phase('shared', 'fetch'):
+                planned_values = request_plan.execute(self._snmp_config, self._map, deadline, partial=True)
+
+        results = {}
+        for collector, result in prepared.items():
+            if result is None:
+                continue  # ran out of time preparing
+            values = result[0]
+            if values is None:
+                if not plans[collector].is_complete(planned_values):
+                    continue  # some of its requests ran out of time
+                values = planned_values
+            results[collector] = collector.timed_build(values, result[1], deadline)
+        return results
+
+    def scrape(self, collectors: list[Collector], deadline: Deadline | None = None) -> dict[Collector, list]:
+        """ collects some of the collectors at the same time, and returns the metric families of each that finished """
+        start = time.monotonic()
+        pdu_count = self._snmp_config.pdu_count
+
+        planned = [collector for collector in collectors if isinstance(collector, PlannedCollector)]
+        # these don't use SNMP (like https), so they don't need a slot and can go at the same time as everything else
+        others = {
+            collector: self._executor.submit(self._collect_other, collector, deadline)
+            for collector in collectors if collector not in planned
+        }
+
+        results = {}
+        try:
+            self._check_circuit(deadline)
+            for collector in planned:
+                collector.start()
+            cutoff = None if deadline is None else Deadline(deadline.remaining() * FETCH_AFTER)
+            check_sentinels(self._snmp_config, planned, cutoff)
+            for prepared in self._prepare_all(planned, deadline, cutoff):
+                results.update(self._fetch_and_build(prepared, deadline))
+        except Exception as e:
+            if self._on_failure is not None:
+                self._on_failure(e)
+            raise e
+
+        timed_out = [collector for collector in planned if collector not in results]
+        for collector in collectors:
+            if collector in others:
+                try:
+                    # re-raises anything the collector raised, same as if it was registered by itself
+                    results[collector] = others[collector].result(timeout=time_left(deadline, None))
+                except (TimeoutError, DeadlineExceeded):
+                    timed_out.append(collector)
+
+        # collectors can share a name, like the fan speeds over https with the fans over SNMP
+        finished = {}
+        for collector in collectors:
+            name = get_collector_name(collector)
+            finished[name] = finished.get(name, True) and collector not in timed_out
+        for name, outcome in finished.items():
+            self._snmp_config.stats.set_outcome(name, outcome)
+        if timed_out:
+            print('ran out of time on %s, leaving out %s' % (self.target, ', '.join(name for name, outcome in finished.items() if not outcome)))
+
+        self._last_pdu_count = self._snmp_config.pdu_count - pdu_count
+        self._snmp_config.stats.observe_scrape(time.monotonic() - start)
+        return results
+
+    def scrape_all(self, deadline: Deadline | None = None) -> dict[Collector, list]:
+        """
+        scrape() of every collector, except that callers at the same time share one scrape. whoever comes first scrapes
+        with their deadline, and everyone else waits on it until theirs
+        """
+        with self._flight_lock:
+            results, finished = self._last_results
+            if results is not None and time.monotonic() - finished < self._reuse_window:
+                self._snmp_config.stats.count(coalesced_scrapes=1)
+                return results
+
+            flight = self._in_flight
+            if flight is None:
+                flight = self._in_flight = Future()
+                leader = True
+            else:
+                self._snmp_config.stats.count(coalesced_scrapes=1)
+                leader = False
+
+        if not leader:
+            try:
+                return flight.result(timeout=time_left(deadline, None))
+            except TimeoutError:
+                return {}  # nothing finished in time
+
+        try:
+            results = self.scrape(self._collectors, deadline)
+            with self._flight_lock:
+                self._last_results = (results, time.monotonic())
+            flight.set_result(results)
+            return results
+        except Exception as e:
+            flight.set_exception(e)
+            raise e
+        finally:
+            with self._flight_lock:
+                self._in_flight = None
+
+    def _collect_other(self, collector: Collector, deadline: Deadline | None) -> list:
+        start = time.monotonic()
+        with deadline_scope(deadline):
+            families = list(collector.collect())
+        self._snmp_config.stats.observe_collector(get_collector_name(collector), time.monotonic() - start)
+        return families
+
+    def collect(self):
+        results = self.scrape_all(current_deadline())
+        for collector in self._collectors:
+            yield from results.get(collector, [])
+
+        yield from self.collect_status()
+
+    def collect_status(self):
+        """ metrics about the exporter itself, rather than the ILO """
+        metric = GaugeMetricFamily('ilo_exporter_scrape_pdus', 'Number of SNMP requests sent to the ILO during the last scrape')
+        metric.add_metric([], self._last_pdu_count)
+        yield metric
+
+        chunk_size = self._snmp_config.chunk_size
+        metric = GaugeMetricFamily('ilo_exporter_snmp_chunk_size', 'Number of var binds currently allowed in a single SNMP request to the ILO')
+        metric.add_metric([], chunk_size.size)
+        yield metric
+
+        metric = CounterMetricFamily('ilo_exporter_snmp_chunk_size_adjustments', 'Number of times the SNMP chunk size for the ILO was adjusted', labels=['direction'])
+        metric.add_metric(['grow'], chunk_size.grown)
+        metric.add_metric(['shrink'], chunk_size.shrunk)
+        yield metric
+
+        yield from self._snmp_config.stats.collect()
@@ -0,0 +1,171 @@
+# background polling mode, where /metrics serves the last results instead of asking the ILO on every scrape
+
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from orchestrator import ScrapeOrchestrator
+from deadline import current_deadline, time_left
+
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import itertools
+import threading
+import time
+import traceback
+
+# seconds between polls of each group of collectors, by group name. Inventory hardly ever changes.
+DEFAULT_INTERVALS = {
+    'power': 5,
+    'temperature': 15,
+    'fan': 15,
+    'cpu': 300,
+    'drive': 300,
+    'memory': 300,
+}
+DEFAULT_INTERVAL = 60  # for anything not listed above
+
+
+def parse_intervals(values: list[str]) -> dict[str, float]:
+    """ parses a list of group=seconds """
+    intervals = dict(DEFAULT_INTERVALS)
+    for value in values:
+        group, _, seconds = value.partition('=')
+        if not group or not seconds:
+            raise ValueError('expected group=seconds, got %s' % value)
+        intervals[group.strip()] = float(seconds)
+        if intervals[group.strip()] <= 0:
+            raise ValueError('interval of group %s must be more than 0' % group)
+    return intervals
+
+
+class Snapshot(object):
+    """ the metric families of a group at some point in time. never changed once made """
+    def __init__(self, families: tuple, timestamp: float):
+        self.families = families
+        self.timestamp = timestamp
+
+
+class BackgroundPoller(Collector):
+    """
+    Collects the collectors of an orchestrator in the background, each group of collectors on its own interval, and
+    serves the latest snapshot of each group when collected. Groups that are due at the same time are collected
+    together, so their requests still get packed together.
+    Collecting only waits on the ILO until a group has been polled for the first time, or the scrape runs out of time.
+    """
+    def __init__(self, orchestrator: ScrapeOrchestrator, intervals: dict[str, float]):
+        self._orchestrator = orchestrator
+        self._intervals = intervals
+        self._groups = {}  # {group: [collectors]}
+        for collector in orchestrator.collectors:
+            self._groups.setdefault(getattr(collector, 'group', 'other'), []).append(collector)
+
+        self._snapshots = {}  # {group: Snapshot}
+        self._first_poll = {group: threading.Event() for group in self._groups}
+        self.stopped = False
+
+    @property
+    def groups(self) -> list[str]:
+        return list(self._groups.keys())
+
+    def get_interval(self, group: str) -> float:
+        return self._intervals.get(group, DEFAULT_INTERVAL)
+
+    def poll(self, groups: list[str]):
+        collectors = [collector for group in groups for collector in self._groups[group]]
+        try:
+            results = self._orchestrator.scrape(collectors)
+            now = time.time()
+            for group in groups:
+                families = tuple(family for collector in self._groups[group] for family in results[collector])
+                self._snapshots[group] = Snapshot(families, now)
+        except Exception as e:
+            # keep serving the last snapshot, the age shows how old it is
+            print('failed to poll', ', '.join(groups), 'for', self._orchestrator.target)
+            traceback.print_exception(e)
+        finally:
+            for group in groups:
+                self._first_poll[group].set()
+
+    def stop(self):
+        self.stopped = True
+
+    def collect(self):
+        snapshots = {}
+        deadline = current_deadline()
+        for group in self._groups:
+            self._first_poll[group].wait(time_left(deadline, None))
+            snapshots[group] = self._snapshots.get(group)
+
+        for snapshot in snapshots.values():
+            if snapshot is not None:
+                yield from snapshot.families
+
+        yield from self._orchestrator.collect_status()
+
+        now = time.time()
+        last_update = GaugeMetricFamily('ilo_exporter_poll_last_update_timestamp_seconds', 'Time of the last successful background poll of each group of collectors', labels=['group'])
+        age = GaugeMetricFamily('ilo_exporter_poll_age_seconds', 'Seconds since the last successful background poll of each group of collectors', labels=['group'])
+        for group, snapshot in snapshots.items():
+            if snapshot is not None:
+                last_update.add_metric([group], snapshot.timestamp)
+                age.add_metric([group], now - snapshot.timestamp)
+        yield last_update
+        yield age
+
+
+class PollScheduler(object):
+    """
+    A single thread that starts the polls of every BackgroundPoller when they're due. The polls get threads of their
+    own, since they wait on the scrape threads.
+    """
+    def __init__(self, max_polls: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_polls, thread_name_prefix='poll')
+        self._queue = []  # heap of (due time, tiebreaker, poller, group)
+        self._counter = itertools.count()
+        self._running = set()  # (poller, group) currently being polled
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        threading.Thread(target=self._run, name='poll-scheduler', daemon=True).start()
+
+    def add(self, poller: BackgroundPoller):
+        now = time.monotonic()
+        with self._lock:
+            for group in poller.groups:
+                heapq.heappush(self._queue, (now, next(self._counter), poller, group))
+        self._wake.set()
+
+    def _pop_due(self) -> dict[BackgroundPoller, list[str]]:
+        """ removes everything that's due from the queue, and schedules the next poll of each """
+        due = {}
+        now = time.monotonic()
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now:
+                _, _, poller, group = heapq.heappop(self._queue)
+                if poller.stopped:
+                    continue
+
+                heapq.heappush(self._queue, (now + poller.get_interval(group), next(self._counter), poller, group))
+                if (poller, group) in self._running:
+                    continue  # the last poll is still going, skip this one
+                self._running.add((poller, group))
+                due.setdefault(poller, []).append(group)
+
+        return due
+
+    def _poll(self, poller: BackgroundPoller, groups: list[str]):
+        try:
+            poller.poll(groups)
+        finally:
+            with self._lock:
+                for group in groups:
+                    self._running.discard((poller, group))
+
+    def _run(self):
+        while True:
+            for poller, groups in self._pop_due().items():
+                self._executor.submit(self._poll, poller, groups)
+
+            with self._lock:
+                timeout = self._queue[0][0] - time.monotonic() if self._queue else None
+            self._wake.wait(timeout)
+            self._wake.clear()
@@ -0,0 +1,143 @@
+# multi-target mode, works like the prometheus snmp_exporter's /probe endpoint
+
+from prometheus_client import CollectorRegistry
+from prometheus_client.exposition import ThreadingWSGIServer
+
+from render_cache import make_cached_wsgi_app
+from deadline import ScrapeBudget
+
+from collections import OrderedDict
+from urllib.parse import parse_qs
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+import threading
+
+
+class ProbeTarget(object):
+    def __init__(self, host: str, port: int, community: str):
+        self.host = host
+        self.port = port
+        self.community = community
+
+    @property
+    def key(self) -> tuple[str, int, str]:
+        return self.host, self.port, self.community
+
+    def __str__(self) -> str:
+        return '%s:%i' % (self.host, self.port)
+
+
+class _ProbeEntry(object):
+    def __init__(self, registry: CollectorRegistry, collectors: list):
+        self.registry = registry
+        self.collectors = collectors
+        self.app = None  # serves the registry, made on the first probe
+
+
+class ProbeTargets(object):
+    """
+    Keeps a registry of collectors for each probed ILO, so that the scan state of each target survives between probes.
+    The least recently probed targets are forgotten once there are more than max_targets of them, along with the app
+    serving their registry, and on_forget is called with each of their collectors.
+    """
+    def __init__(self, create_collectors, max_targets: int, on_forget: any = None):
+        self._create_collectors = create_collectors
+        self._max_targets = max_targets
+        self._on_forget = on_forget
+        self._entries = OrderedDict()  # {target key: _ProbeEntry}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get_entry(self, target: ProbeTarget) -> _ProbeEntry:
+        with self._lock:
+            entry = self._entries.get(target.key)
+            if entry is not None:
+                self._entries.move_to_end(target.key)
+                return entry
+
+        # building collectors can scan the target, so don't hold up other probes while doing it
+        registry = CollectorRegistry(auto_describe=False)
+        collectors = self._create_collectors(target)
+        for collector in collectors:
+            registry.register(collector)
+
+        forgotten = []
+        with self._lock:
+            # someone else may have beaten us to it
+            if target.key in self._entries:
+                forgotten.append(collectors)
+            else:
+                self._entries[target.key] = _ProbeEntry(registry, collectors)
+            entry = self._entries[target.key]
+            self._entries.move_to_end(target.key)
+            while len(self._entries) > self._max_targets:
+                _, old = self._entries.popitem(last=False)
+                forgotten.append(old.collectors)
+
+        if self._on_forget is not None:
+            for collectors in forgotten:
+                for collector in collectors:
+                    self._on_forget(collector)
+
+        return entry
+
+    def get_registry(self, target: ProbeTarget) -> CollectorRegistry:
+        return self._get_entry(target).registry
+
+    def get_app(self, target: ProbeTarget, make_app) -> any:
+        """ returns the app serving the registry of the target, made with make_app(registry) the first time """
+        entry = self._get_entry(target)
+        with self._lock:
+            if entry.app is None:
+                entry.app = make_app(entry.registry)
+            return entry.app
+
+
+def parse_target(query: dict[str, list[str]], default_port: int, default_community: str) -> ProbeTarget:
+    target = query.get('target', [''])[0].strip()
+    if not target:
+        raise ValueError('missing target parameter')
+
+    host, port = target, default_port
+    if target.count(':') == 1:  # leave ipv6 addresses alone
+        host, port = target.split(':')
+        port = int(port)
+
+    community = query.get('community', [default_community])[0]
+    return ProbeTarget(host, port, community)
+
+
+def make_probe_app(targets: ProbeTargets, metrics_app, default_port: int, default_community: str, budget: ScrapeBudget | None = None):
+    """ serves /probe?target=<ilo>[&community=<community>], and passes everything else on to metrics_app """
+    def make_app(registry: CollectorRegistry):
+        return make_cached_wsgi_app(registry, budget)  # so each target keeps its render cache
+
+    def app(environ, start_response):
+        if environ['PATH_INFO'] != '/probe':
+            return metrics_app(environ, start_response)
+
+        query = parse_qs(environ['QUERY_STRING'])
+        try:
+            target = parse_target(query, default_port, default_community)
+        except ValueError as e:
+            start_response('400 Bad Request', [('Content-Type', 'text/plain')])
+            return [('bad target: %s\n' % e).encode()]
+
+        return targets.get_app(target, make_app)(environ, start_response)
+
+    return app
+
+
+class _SilentHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_probe_server(port: int, addr: str, app) -> tuple[ThreadingWSGIServer, threading.Thread]:
+    """ same as prometheus_client.start_http_server, but with our own app """
+    server = make_server(addr, port, app, ThreadingWSGIServer, handler_class=_SilentHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, thread
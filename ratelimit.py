@@ -0,0 +1,57 @@
+# upper bounds on how hard each ILO gets asked, no matter how many scrapes, collectors and probes want something from it
+
+from deadline import Deadline, DeadlineExceeded
+
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    Hands out rate tokens a second, with up to burst of them saved up for when nobody's asking. Tokens can be taken
+    before they're there, in which case the taker waits until they would have been, so everyone waiting gets their turn
+    in the order they asked. Taking more than burst at once is fine, it just takes longer.
+    """
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.burst = max(1.0, rate if burst is None else burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        """ needs the lock """
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, tokens: float) -> float:
+        """ takes the tokens, and returns the seconds to wait before using them """
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def give_back(self, tokens: float):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.burst, self._tokens + tokens)
+
+
+def reserve(limits: list[tuple[TokenBucket | None, float]], deadline: Deadline | None) -> float:
+    """
+    takes the tokens from each bucket, and returns the seconds to wait until all of them are there. raises
+    DeadlineExceeded without taking anything if that's past the deadline
+    """
+    taken = []
+    seconds = 0.0
+    for bucket, tokens in limits:
+        if bucket is not None:
+            seconds = max(seconds, bucket.take(tokens))
+            taken.append((bucket, tokens))
+
+    if deadline is not None and seconds > deadline.remaining():
+        for bucket, tokens in taken:
+            bucket.give_back(tokens)
+        raise DeadlineExceeded('the rate limit of the ILO would wait past the deadline')
+    return seconds
@@ -0,0 +1,116 @@
+# serves metrics like prometheus_client.make_wsgi_app, but without rendering the same text over and over
+
+from prometheus_client.exposition import choose_encoder, gzip_accepted, make_wsgi_app
+
+from instrumentation import Histogram
+from deadline import ScrapeBudget, deadline_scope
+
+from urllib.parse import parse_qs
+import gzip
+import threading
+import time
+
+OPENMETRICS_EOF = b'# EOF\n'
+
+
+class _SingleFamily(object):
+    """ looks enough like a registry for the encoders """
+    def __init__(self, family):
+        self._family = family
+
+    def collect(self):
+        return [self._family]
+
+
+class RenderCache(object):
+    """
+    Renders the metrics of a registry in whichever format was asked for, remembering the text of each metric family.
+    A family is only rendered again when its samples changed since last time, which for inventory like drive info is
+    hardly ever. The gzipped body is kept too, and reused as long as the body is the same.
+    It's also a collector of how long rendering takes, not counting collecting the metrics.
+    """
+    def __init__(self, registry):
+        self._registry = registry
+        self._families = {}  # {(content type, name): (samples, text)}
+        self._bodies = {}  # {content type: (body, gzipped body)}
+        self._lock = threading.Lock()
+        self._durations = Histogram()
+
+    def collect(self):
+        with self._lock:
+            yield self._durations.to_family('ilo_exporter_render_duration_seconds', 'Seconds taken to render the collected metrics into the response body', ['format'])
+
+    def _render_family(self, family, encoder, content_type: str) -> bytes:
+        key = (content_type, family.name)
+        samples = (family.type, family.documentation, family.unit, family.samples)
+        cached = self._families.get(key)
+        if cached is not None and cached[0] == samples:
+            return cached[1]
+
+        text = encoder(_SingleFamily(family))
+        if text.endswith(OPENMETRICS_EOF):
+            text = text[:-len(OPENMETRICS_EOF)]  # only goes at the very end
+        self._families[key] = (samples, text)
+        return text
+
+    def render(self, accept_header: str | None, use_gzip: bool) -> tuple[bytes, str]:
+        """ returns the body and its content type """
+        encoder, content_type = choose_encoder(accept_header)
+        families = list(self._registry.collect())
+
+        with self._lock:
+            start = time.monotonic()
+            try:
+                return self._render(families, encoder, content_type, use_gzip)
+            finally:
+                self._durations.observe((content_type.partition(';')[0],), time.monotonic() - start)
+
+    def _render(self, families: list, encoder, content_type: str, use_gzip: bool) -> tuple[bytes, str]:
+        """ needs the lock """
+        seen = {(content_type, family.name) for family in families}
+        body = b''.join(self._render_family(family, encoder, content_type) for family in families)
+        if content_type.startswith('application/openmetrics-text'):
+            body += OPENMETRICS_EOF
+
+        # forget families that went away
+        for key in [key for key in self._families if key[0] == content_type and key not in seen]:
+            del self._families[key]
+
+        if not use_gzip:
+            return body, content_type
+
+        cached = self._bodies.get(content_type)
+        if cached is None or cached[0] != body:
+            cached = (body, gzip.compress(body))
+            self._bodies[content_type] = cached
+        return cached[1], content_type
+
+
+def make_cached_wsgi_app(registry, budget: ScrapeBudget | None = None):
+    """
+    same as prometheus_client.make_wsgi_app, but with a RenderCache. with a budget, the collectors get the deadline of
+    each scrape, see deadline.py
+    """
+    cache = RenderCache(registry)
+    registry.register(cache)
+    fallback = make_wsgi_app(registry)
+
+    def app(environ, start_response):
+        with deadline_scope(budget.get_deadline(environ) if budget is not None else None):
+            return serve(environ, start_response)
+
+    def serve(environ, start_response):
+        if environ['REQUEST_METHOD'] != 'GET' or environ['PATH_INFO'] == '/favicon.ico':
+            return fallback(environ, start_response)
+        if 'name[]' in parse_qs(environ.get('QUERY_STRING', '')):
+            return fallback(environ, start_response)  # not worth caching
+
+        use_gzip = gzip_accepted(environ.get('HTTP_ACCEPT_ENCODING'))
+        body, content_type = cache.render(environ.get('HTTP_ACCEPT'), use_gzip)
+        headers = [('Content-Type', content_type)]
+        if use_gzip:
+            headers.append(('Content-Encoding', 'gzip'))
+        start_response('200 OK', headers)
+        return [body]
+
+    return app
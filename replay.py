@@ -0,0 +1,208 @@
+# records what an ILO answers over SNMP and HTTPS to a file, and answers from that file later instead of the ILO
+
+from snmp_lite import LiteClient, LiteEngine, ErrorStatus, END_OF_MIB, GET, GET_NEXT, GET_BULK, TIMEOUT_ERROR
+from https import HttpsConfiguration, fetch_json_response
+from deadline import Deadline, check_deadline, time_left
+
+import bisect
+import gzip
+import json
+import os
+import threading
+import time
+
+FORMAT_VERSION = 1
+
+# seconds between writes of a recording while it changes
+FLUSH_INTERVAL = 5
+
+# response times to keep for each kind of request, so a long recording doesn't grow forever
+MAX_TIMINGS = 10000
+
+PDU_NAMES = {GET: 'get', GET_NEXT: 'get_next', GET_BULK: 'get_bulk'}
+
+
+class WalkAnswers(object):
+    """ answers requests from a walk, the same way an agent holding just those oids would """
+    def __init__(self, walk: dict[tuple[int], str | int]):
+        self._walk = walk
+        self._oids = sorted(walk)
+
+    def __len__(self) -> int:
+        return len(self._oids)
+
+    def next(self, oid: tuple[int]) -> tuple[tuple[int], str | int]:
+        i = bisect.bisect_right(self._oids, oid)
+        if i == len(self._oids):
+            return oid, END_OF_MIB
+        return self._oids[i], self._walk[self._oids[i]]
+
+    def answer(self, pdu_type: int, oids: list[tuple[int]], non_repeaters: int = 0, max_repetitions: int = 0) -> list[tuple[tuple[int], any]]:
+        if pdu_type == GET:
+            return [(oid, self._walk.get(oid)) for oid in oids]
+        elif pdu_type == GET_NEXT:
+            return [self.next(oid) for oid in oids]
+
+        var_binds = [self.next(oid) for oid in oids[:non_repeaters]]
+        current = oids[non_repeaters:]
+        for _ in range(max_repetitions):
+            row = [self.next(oid) for oid in current]
+            var_binds.extend(row)
+            if all(value is END_OF_MIB for _, value in row):
+                break
+            current = [oid for oid, _ in row]
+        return var_binds
+
+
+def to_key(oid: tuple[int]) -> str:
+    return '.'.join(map(str, oid))
+
+
+def from_key(key: str) -> tuple[int]:
+    return tuple(int(i) for i in key.split('.'))
+
+
+class SessionRecorder(object):
+    """
+    Keeps every var bind and HTTPS response seen for each ILO, along with how long each request took, and writes it all
+    to a gzipped JSON file every few seconds while anything changes. Only the latest value of each oid is kept, so a
+    recording stays about the size of a walk no matter how long it runs.
+    """
+    def __init__(self, path: str):
+        self._path = path
+        self._snmp = {}  # {target: {'values': {oid: value}, 'seconds': {pdu name: [seconds]}}}
+        self._https = {}  # {host: {endpoint: {'response': json, 'seconds': [seconds]}}}
+        self._lock = threading.Lock()
+        self._dirty = False
+        threading.Thread(target=self._flush, name='recorder', daemon=True).start()
+
+    @staticmethod
+    def _add_timing(timings: list[float], seconds: float):
+        timings.append(round(seconds, 6))
+        if len(timings) > MAX_TIMINGS:
+            del timings[0]
+
+    def record_snmp(self, target: str, pdu_type: int, var_binds: list[tuple[tuple[int], any]], seconds: float):
+        with self._lock:
+            session = self._snmp.setdefault(target, {'values': {}, 'seconds': {}})
+            for oid, value in var_binds:
+                if value is not None and value is not END_OF_MIB:
+                    session['values'][to_key(oid)] = value
+            self._add_timing(session['seconds'].setdefault(PDU_NAMES[pdu_type], []), seconds)
+            self._dirty = True
+
+    def record_https(self, host: str, endpoint: str, response, seconds: float):
+        with self._lock:
+            recorded = self._https.setdefault(host, {}).setdefault(endpoint, {'response': None, 'seconds': []})
+            recorded['response'] = response
+            self._add_timing(recorded['seconds'], seconds)
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({'version': FORMAT_VERSION, 'snmp': self._snmp, 'https': self._https}, separators=(',', ':'))
+            self._dirty = False
+
+        # written next to it first, so a crash never leaves half a recording behind
+        temp_path = self._path + '.tmp'
+        with gzip.open(temp_path, 'wt') as f:
+            f.write(data)
+        os.replace(temp_path, self._path)
+
+    def _flush(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            if not self._dirty:
+                continue
+            try:
+                self.save()
+            except OSError as e:
+                print('failed to save recording to', self._path, e)
+
+
+class RecordingEngine(LiteEngine):
+    """ a LiteEngine that records everything it gets. also fetches and records HTTPS responses, see HttpsConfiguration """
+    def __init__(self, recorder: SessionRecorder):
+        super().__init__()
+        self.recorder = recorder
+
+    def request(self, c, pdu_type: int, oids: list[tuple[int]], max_repetitions: int = 0, deadline: Deadline | None = None) -> tuple:
+        start = time.monotonic()
+        engine_err, agent_err, agent_err_index, var_binds = super().request(c, pdu_type, oids, max_repetitions, deadline)
+        if engine_err is None and not agent_err:
+            self.recorder.record_snmp(c.target, pdu_type, var_binds, time.monotonic() - start)
+        return engine_err, agent_err, agent_err_index, var_binds
+
+    def get_json(self, c: HttpsConfiguration, endpoint: str, deadline: Deadline | None = None):
+        start = time.monotonic()
+        response = fetch_json_response(c, endpoint, deadline)
+        self.recorder.record_https(c.host, endpoint, response, time.monotonic() - start)
+        return response
+
+
+class Session(object):
+    """ a recording, loaded back in """
+    def __init__(self, path: str):
+        with gzip.open(path, 'rt') as f:
+            data = json.load(f)
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError('%s is not a recording this version can read' % path)
+
+        self.walks = {}  # {target: WalkAnswers}
+        self.timings = {}  # {(target, pdu name): [seconds]}
+        for target, session in data['snmp'].items():
+            self.walks[target] = WalkAnswers({from_key(key): value for key, value in session['values'].items()})
+            for pdu_name, seconds in session['seconds'].items():
+                self.timings[(target, pdu_name)] = seconds
+
+        self.https = {}  # {(host, endpoint): response}
+        for host, endpoints in data['https'].items():
+            for endpoint, recorded in endpoints.items():
+                self.https[(host, endpoint)] = recorded['response']
+                self.timings[(host, endpoint)] = recorded['seconds']
+
+
+class ReplayEngine(LiteClient):
+    """
+    Answers SNMP requests, and HTTPS requests when used as the transport of an HttpsConfiguration, from a recording
+    instead of an ILO. ILOs that aren't in the recording never answer, same as if they were offline.
+    With timing, each answer takes as long as the recorded requests of its kind did, going through them in order.
+    """
+    def __init__(self, session: Session, timing: bool = False):
+        self._session = session
+        self._timing = timing
+        self._positions = {}  # {timing key: position of the next recorded time to use}
+        self._lock = threading.Lock()
+
+    def _wait(self, key: tuple, deadline: Deadline | None):
+        timings = self._session.timings.get(key)
+        if not self._timing or not timings:
+            return
+        with self._lock:
+            position = self._positions.get(key, 0)
+            self._positions[key] = (position + 1) % len(timings)
+        self._sleep(timings[position], deadline)
+
+    @staticmethod
+    def _sleep(seconds: float, deadline: Deadline | None):
+        time.sleep(time_left(deadline, seconds))
+        check_deadline(deadline)
+
+    def request(self, c, pdu_type: int, oids: list[tuple[int]], max_repetitions: int = 0, deadline: Deadline | None = None) -> tuple:
+        check_deadline(deadline)
+        walk = self._session.walks.get(c.target)
+        if walk is None:
+            self._sleep(c.transport.timeout * (c.transport.retries + 1), deadline)
+            return TIMEOUT_ERROR, 0, 0, []
+
+        self._wait((c.target, PDU_NAMES[pdu_type]), deadline)
+        return None, ErrorStatus(0), 0, walk.answer(pdu_type, oids, 0, max_repetitions)
+
+    def get_json(self, c: HttpsConfiguration, endpoint: str, deadline: Deadline | None = None):
+        check_deadline(deadline)
+        key = (c.host, endpoint)
+        if key not in self._session.https:
+            raise ConnectionError('%s was not recorded for %s' % (endpoint, c.host))
+
+        self._wait(key, deadline)
+        return self._session.https[key]
@@ -1,14 +1,16 @@
-from snmp import snmp_walk, SnmpConfiguration, SnmpEngine, CommunityData, UdpTransportTarget, ContextData
+from snmp import snmp_bulk_walk, parse_oid, SnmpConfiguration, EnginePool, CommunityData, UdpTransportTarget, ContextData
 from https import get_json_response, HttpsConfiguration
 from targets.fan import FAN_ENDPOINT
 from targets.temp import TEMP_ENDPOINT
+from snmp_groups import TableFrame
+from deadline import Deadline
 import traceback
 
 
-def detect_things(c: SnmpConfiguration, base_oid: str) -> list[int]:
+def detect_things(c: SnmpConfiguration, base_oid: str, deadline: Deadline | None = None) -> list[int]:
     """ Scans for things and returns a list of their ids. """
     things = []
-    for _, index in snmp_walk(c, base_oid):
+    for _, index in snmp_bulk_walk(c, base_oid, deadline):
         assert isinstance(index, int)
         assert index not in things
         things.append(index)
@@ -17,22 +19,22 @@ def detect_things(c: SnmpConfiguration, base_oid: str) -> list[int]:
 
 # because of the way drive indexing works, this is the simplest way I can think to do it without over-complicating
 # everything else
-def detect_complex(c: SnmpConfiguration, base_oid: str) -> list[tuple[int]]:
+def detect_complex(c: SnmpConfiguration, base_oid: str, deadline: Deadline | None = None) -> list[tuple[int]]:
     """ Scans for things and returns a list of their oid indexes. """
     drives = []
-    for oid, _ in snmp_walk(c, base_oid):
-        index = oid[len(base_oid) + 1:]
-        index = (*[int(i) for i in index.split('.')],)
+    base_oid = parse_oid(base_oid)
+    for oid, _ in snmp_bulk_walk(c, base_oid, deadline):
+        index = oid[len(base_oid):]
         assert index not in drives
         drives.append(index)
     return drives
 
 
 # since there's only two that get fetched via https, these are just kinda hacked together
-def get_fan_speeds(c: HttpsConfiguration) -> dict[int, tuple[int | float, str]]:  # {id: (speed, unit)}
+def get_fan_speeds(c: HttpsConfiguration, deadline: Deadline | None = None) -> dict[int, tuple[int | float, str]]:  # {id: (speed, unit)}
     speed_map = {}
 
-    response = get_json_response(c, FAN_ENDPOINT)
+    response = get_json_response(c, FAN_ENDPOINT, deadline)
     try:
         fans = response['fans']
         for fan in fans:
@@ -114,7 +116,7 @@ if __name__ == '__main__':
     from targets.logical_drive import LOGICAL_DRIVES_INDEX
 
     config = SnmpConfiguration(
-        SnmpEngine(),
+        EnginePool(),
         CommunityData('public'),
         UdpTransportTarget(('192.168.100.88', 161)),
         ContextData(),
@@ -135,29 +137,15 @@ if __name__ == '__main__':
     print('\'puter has', len(drives), 'physical drives')
     print('\'puter has', len(memory_slots), 'memory slots')
 
-    for ilo_enum in FAN_VALUES:
-        states = ilo_enum.get_values(config, fans)
-        for fan in fans:
-            print('fan', fan, ilo_enum.name, 'is', states[fan])
-        print()
-
-    for value in TEMP_VALUES:
-        states = value.get_values(config, temp_sensors)
-        for sensor in temp_sensors:
-            print('temperature', sensor, value.name, 'is', states[sensor])
-        print()
-
-    for value in CPU_VALUES:
-        states = value.get_values(config, cpus)
-        for cpu in cpus:
-            print('cpu', cpu, value.name, 'is', states[cpu])
-        print()
-
-    for value in MEMORY_VALUES:
-        states = value.get_values(config, memory_slots)
-        for slot in memory_slots:
-            print('memory slot', slot, value.name, 'is', states[slot])
-        print()
+    for name, things, values in [('fan', fans, FAN_VALUES), ('temperature', temp_sensors, TEMP_VALUES), ('cpu', cpus, CPU_VALUES), ('memory slot', memory_slots, MEMORY_VALUES)]:
+        frame = TableFrame(things)
+        for value in values:
+            frame.add(value.name, value.get_column(config, things))
+
+        for row in frame.rows():
+            for value in values:
+                print(name, row.index, value.name, 'is', row[value.name])
+            print()
 
     print('asdf')
     conf = HttpsConfiguration(
@@ -0,0 +1,190 @@
+# a fake ILO that answers SNMP from a recorded walk, or from made up tables of any size. used by benchmark.py
+
+from snmp_lite import encode_message, decode_message, DecodeError, GET, GET_NEXT, GET_BULK, RESPONSE
+from replay import WalkAnswers
+from snmp_groups import BulkEnums, BulkNumbers
+from snmp import parse_oid
+from targets.temp import TEMP_INDEX, TEMP_VALUES
+from targets.fan import FAN_INDEX, FAN_VALUES
+from targets.cpu import CPU_INDEX, CPU_VALUES
+from targets.memory import MEMORY_INDEX, MEMORY_VALUES
+from targets.drive import DRIVE_INDEX, DRIVE_VALUES
+from targets.power import POWER_METER_READING, POWER_METER_SUPPORT, POWER_METER_STATUS
+
+import argparse
+import json
+import random
+import re
+import socket
+import sys
+import threading
+
+TOO_BIG = 1
+
+# {table: (index column, values, whether rows are indexed by controller and drive)}
+TABLES = {
+    'temperature': (TEMP_INDEX, TEMP_VALUES, False),
+    'fan': (FAN_INDEX, FAN_VALUES, False),
+    'cpu': (CPU_INDEX, CPU_VALUES, False),
+    'memory': (MEMORY_INDEX, MEMORY_VALUES, False),
+    'drive': (DRIVE_INDEX, DRIVE_VALUES, True),
+}
+
+DEFAULT_SIZES = {
+    'temperature': 40,
+    'fan': 6,
+    'cpu': 2,
+    'memory': 16,
+    'drive': 24,
+}
+
+
+def generate_walk(sizes: dict[str, int]) -> dict[tuple[int], str | int]:
+    """ makes up a walk with the given number of rows in each table, with values that look about right """
+    walk = {
+        parse_oid(POWER_METER_READING): 250,
+        parse_oid(POWER_METER_SUPPORT): 2,
+        parse_oid(POWER_METER_STATUS): 2,
+    }
+
+    for table, (index_oid, values, by_controller) in TABLES.items():
+        index_oid = parse_oid(index_oid)
+        for i in range(1, sizes.get(table, 0) + 1):
+            index = (0, i) if by_controller else (i,)
+            walk[index_oid + index] = i
+            for value in values:
+                if isinstance(value, BulkEnums):
+                    v = 2 if 2 in value.state_map else next(iter(value.state_map))
+                elif isinstance(value, BulkNumbers):
+                    v = 20 + (i * 7) % 50
+                else:
+                    v = '%s %i' % (value.name, i)
+                walk[value.column + index] = v
+
+    return walk
+
+
+def load_walk(path: str) -> dict[tuple[int], str | int]:
+    """ reads the output of snmpwalk -On, only keeping the types the exporter reads """
+    walk = {}
+    line_format = re.compile(r'^\.?([\d.]+) = (\w+): ?(.*)$')
+    with open(path) as f:
+        for line in f:
+            match = line_format.match(line.strip())
+            if match is None:
+                continue
+            oid, kind, value = match.groups()
+            if kind in ('INTEGER', 'Gauge32', 'Counter32', 'Counter64', 'Timeticks'):
+                value = re.search(r'-?\d+', value)
+                if value is None:
+                    continue
+                walk[parse_oid(oid)] = int(value.group())
+            elif kind in ('STRING', 'Hex-STRING', 'IpAddress'):
+                walk[parse_oid(oid)] = value.strip('"')
+    return walk
+
+
+class SimulatedIlo(object):
+    """
+    Answers GET, GETNEXT and GETBULK from a walk over UDP. Every response is sent after the given latency, requests
+    are dropped at random as often as loss says, and requests with more var binds than max_var_binds get tooBig.
+    Counts requests and bytes both ways, so a benchmark can tell what went over the wire.
+    """
+    def __init__(self, walk: dict[tuple[int], str | int], port: int = 0, address: str = '127.0.0.1', latency: float = 0, loss: float = 0, max_var_binds: int | None = None):
+        self._answers = WalkAnswers(walk)
+        self._latency = latency
+        self._loss = loss
+        self._max_var_binds = max_var_binds
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((address, port))
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'responses': 0, 'dropped': 0, 'var_binds': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._socket.getsockname()
+
+    def answer(self, pdu_type: int, oids: list[tuple[int]], non_repeaters: int, max_repetitions: int) -> tuple[int, int, list]:
+        """ returns the error status, error index and var binds to respond with """
+        if self._max_var_binds is not None and len(oids) > self._max_var_binds:
+            return TOO_BIG, 0, [(oid, None) for oid in oids]
+        return 0, 0, self._answers.answer(pdu_type, oids, non_repeaters, max_repetitions)
+
+    def get_latency(self, pdu_type: int, oids: list[tuple[int]]) -> float:
+        """ returns the seconds to wait before answering a request, which subclasses can make slower for some oids """
+        return self._latency
+
+    def get_stats(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
+
+    def _send(self, data: bytes, address: tuple):
+        with self._lock:
+            self.stats['responses'] += 1
+            self.stats['bytes_out'] += len(data)
+        self._socket.sendto(data, address)
+
+    def serve_forever(self):
+        while True:
+            data, address = self._socket.recvfrom(65535)
+            with self._lock:
+                self.stats['requests'] += 1
+                self.stats['bytes_in'] += len(data)
+                if self._loss and random.random() < self._loss:
+                    self.stats['dropped'] += 1
+                    continue
+
+            try:
+                community, pdu_type, request_id, field1, field2, var_binds = decode_message(data)
+            except DecodeError as e:
+                print('ignoring bad request from', address, e, file=sys.stderr)
+                continue
+            if pdu_type not in (GET, GET_NEXT, GET_BULK):
+                continue
+
+            if pdu_type != GET_BULK:
+                field1, field2 = 0, 0
+            oids = [oid for oid, _ in var_binds]
+            latency = self.get_latency(pdu_type, oids)
+            error_status, error_index, var_binds = self.answer(pdu_type, oids, field1, field2)
+            with self._lock:
+                self.stats['var_binds'] += len(var_binds)
+            response = encode_message(community, RESPONSE, request_id, error_status, error_index, var_binds)
+
+            if latency:
+                threading.Timer(latency, self._send, (response, address)).start()
+            else:
+                self._send(response, address)
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name='sim-agent', daemon=True)
+        thread.start()
+        return thread
+
+
+arg_parser = argparse.ArgumentParser(description='Answers SNMP like an ILO would, from a recorded walk or made up tables. Prints its address, then answers "stats" lines on stdin with a JSON line of what it has seen so far.')
+arg_parser.add_argument('-a', '--address', default='127.0.0.1', help='Address to bind.')
+arg_parser.add_argument('-p', '--port', default=0, type=int, help='Port to bind, or 0 for any free port.')
+arg_parser.add_argument('--walk', help='Output of snmpwalk -On to answer from, instead of made up tables.')
+arg_parser.add_argument('--latency', default=0, type=float, help='Seconds to wait before sending each response.')
+arg_parser.add_argument('--loss', default=0, type=float, help='Share of requests to drop, from 0 to 1.')
+arg_parser.add_argument('--max-var-binds', type=int, help='Answer requests with more var binds than this with tooBig, like older ILOs.')
+for table, size in DEFAULT_SIZES.items():
+    arg_parser.add_argument('--%ss' % table if table != 'memory' else '--memory', default=size, type=int, dest=table, metavar='N', help='Number of rows in the made up %s table.' % table)
+
+
+if __name__ == '__main__':
+    args = arg_parser.parse_args()
+
+    if args.walk is not None:
+        walk = load_walk(args.walk)
+    else:
+        walk = generate_walk({table: getattr(args, table) for table in TABLES})
+
+    agent = SimulatedIlo(walk, args.port, args.address, args.latency, args.loss, args.max_var_binds)
+    agent.start()
+    print(json.dumps({'address': agent.address[0], 'port': agent.address[1], 'oids': len(walk)}), flush=True)
+
+    for line in sys.stdin:
+        if line.strip() == 'stats':
+            print(json.dumps(agent.get_stats()), flush=True)
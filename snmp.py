@@ -1,17 +1,154 @@
 # just a highly simplified wrapper over pysnmp
 
-from pysnmp.hlapi import NoSuchInstance, Integer, Integer32, Counter32, OctetString, ObjectType, ObjectIdentity, getCmd, nextCmd, SnmpEngine, CommunityData, UdpTransportTarget, ContextData
+from pysnmp.hlapi import NoSuchInstance, EndOfMibView, Integer, Integer32, Counter32, OctetString, ObjectType, ObjectIdentity, getCmd, nextCmd, bulkCmd, SnmpEngine, CommunityData, UdpTransportTarget, ContextData
 
-# for bulk requests. I find large requests crash the ilo (lol)
-MAX_CHUNK = 64
+from pysnmp.smi.view import MibViewController
+
+from chunk_size import AdaptiveChunkSize
+from snmp_lite import LiteClient, END_OF_MIB, TIMEOUT_ERROR
+from instrumentation import ScrapeStats
+from deadline import Deadline, DeadlineExceeded, check_deadline, time_left
+from breaker import CircuitBreaker
+from ratelimit import TokenBucket, reserve
+
+from contextlib import contextmanager
+from functools import lru_cache
+import asyncio
+import math
+import threading
+import time
+
+# default number of rows to ask for per GETBULK request when walking
+MAX_REPETITIONS = 25
+
+# default number of requests allowed to be waiting on each target at once with the asyncio api
+WINDOW = 3
+
+# number of resolved oids to keep around. every ILO shares them, and there are only a few hundred per ILO
+OBJECT_CACHE_SIZE = 65536
+
+
+class EnginePool(object):
+    """
+    Hands out SNMP engines to whoever is making a request. The synchronous pysnmp api runs the engine's dispatcher
+    inside of each call, so an engine can't be used by two threads at once. Engines are created as needed and kept
+    around for reuse, so the pool only ever grows to the number of requests made at the same time, no matter how many
+    ILOs are being scraped.
+    """
+    def __init__(self):
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self) -> SnmpEngine:
+        with self._lock:
+            engine = self._idle.pop() if self._idle else SnmpEngine()
+        try:
+            yield engine
+        finally:
+            with self._lock:
+                self._idle.append(engine)
+
+
+class AsyncEngine(object):
+    """
+    Runs a single pysnmp asyncio engine on an event loop in a thread of its own. Every target shares it, and each one
+    can have up to window requests waiting on it at once, without a thread or an engine for each of them.
+    Use run() to wait on a coroutine from any other thread.
+    """
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name='snmp-asyncio', daemon=True).start()
+
+        # the engine's dispatcher grabs the current loop when it's made, so it has to be made on the loop
+        self.engine = self.run(self._create_engine())
+
+    @staticmethod
+    async def _create_engine():
+        from pysnmp.hlapi.asyncio import SnmpEngine as AsyncSnmpEngine
+        return AsyncSnmpEngine()
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
 
 
 class SnmpConfiguration(object):
-    def __init__(self, engine: SnmpEngine, auth: CommunityData, transport: UdpTransportTarget, context: ContextData):
-        self.engine = engine
+    def __init__(self, engines: EnginePool | AsyncEngine | LiteClient, auth: CommunityData, transport: UdpTransportTarget, context: ContextData, max_repetitions: int = MAX_REPETITIONS, chunk_size: AdaptiveChunkSize = None, breaker: CircuitBreaker | None = None, pdu_limit: TokenBucket | None = None, var_bind_limit: TokenBucket | None = None):
+        self.engines = engines
         self.auth = auth
         self.transport = transport
         self.context = context
+        self.max_repetitions = max_repetitions  # 0 disables GETBULK walks
+        self.chunk_size = AdaptiveChunkSize() if chunk_size is None else chunk_size
+        self.breaker = breaker
+        self.pdu_limit = pdu_limit  # requests per second to the ILO
+        self.var_bind_limit = var_bind_limit  # var binds per second asked for, counting every row of a GETBULK
+        self.stats = ScrapeStats()
+        if breaker is not None:
+            self.stats.breakers['snmp'] = breaker
+
+        # only used with the asyncio api
+        self.window = asyncio.Semaphore(engines.window) if self.is_async else None
+        self._async_transport = None
+
+    @property
+    def is_async(self) -> bool:
+        return isinstance(self.engines, AsyncEngine)
+
+    @property
+    def is_lite(self) -> bool:
+        return isinstance(self.engines, LiteClient)
+
+    @property
+    def async_transport(self):
+        """ the asyncio version of transport """
+        if self._async_transport is None:
+            from pysnmp.hlapi.asyncio import UdpTransportTarget as AsyncUdpTransportTarget
+            self._async_transport = AsyncUdpTransportTarget(self.transport.transportAddr, timeout=self.transport.timeout, retries=self.transport.retries)
+        return self._async_transport
+
+    @property
+    def target(self) -> str:
+        host, port = self.transport.transportAddr
+        return '%s:%i' % (host, port)
+
+    @property
+    def pdu_count(self) -> int:
+        """ number of requests sent so far """
+        return self.stats.counters['snmp_pdus']
+
+    def count_pdu(self, var_binds: int = 1):
+        self.stats.count(snmp_pdus=1, snmp_var_binds=var_binds)
+
+    @property
+    def failing(self) -> bool:
+        """ whether the ILO didn't answer the last request, as far as the circuit breaker knows """
+        return self.breaker is not None and self.breaker.failing
+
+    def check_circuit(self):
+        """ raises CircuitOpenError if the ILO isn't answering, see CircuitBreaker """
+        if self.breaker is not None:
+            self.breaker.check_request()
+
+    def _reserve(self, var_binds: int, deadline: Deadline | None) -> float:
+        if self.pdu_limit is None and self.var_bind_limit is None:
+            return 0
+        seconds = reserve([(self.pdu_limit, 1), (self.var_bind_limit, var_binds)], deadline)
+        if seconds > 0:
+            self.stats.count(snmp_throttled_requests=1, snmp_throttle_seconds=seconds)
+        return seconds
+
+    def throttle(self, var_binds: int, deadline: Deadline | None):
+        """ waits until a request of this many var binds is within the rate limits, or raises DeadlineExceeded """
+        seconds = self._reserve(var_binds, deadline)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    async def throttle_async(self, var_binds: int, deadline: Deadline | None):
+        seconds = self._reserve(var_binds, deadline)
+        if seconds > 0:
+            await asyncio.sleep(seconds)
 
 
 class AgentError(Exception):
@@ -22,9 +159,91 @@ class EngineError(Exception):
     pass
 
 
+class TooBigError(AgentError):
+    pass
+
+
+class WalkError(Exception):
+    pass
+
+
+def check_errors(c: SnmpConfiguration, engine_err, agent_err, agent_err_index, var_binds):
+    if engine_err:
+        if str(engine_err) == TIMEOUT_ERROR:
+            c.stats.count(snmp_timeouts=1)
+        if c.breaker is not None:
+            c.breaker.failed()
+        raise EngineError(engine_err)
+
+    if c.breaker is not None:
+        c.breaker.succeeded()  # even with an error, the agent answered
+    if agent_err:
+        error = TooBigError if int(agent_err) == 1 else AgentError
+        raise error('%s at %s' % (agent_err.prettyPrint(), var_binds[int(agent_err_index) - 1] if agent_err_index else '?'))
+
+
+def chunk_failed(c: SnmpConfiguration, requested: int, e: Exception, failing: bool):
+    """
+    lets the chunk size know a request failed. a timeout while the ILO already wasn't answering has nothing to do with
+    the size, so it's left alone
+    """
+    if isinstance(e, TooBigError):
+        c.chunk_size.failed(requested)
+    elif not failing:
+        c.chunk_size.failed(requested, too_big=False)
+
+
+def check_response(c: SnmpConfiguration, requested: int, received: int, start: float, engine_err, agent_err, agent_err_index, var_binds):
+    """ raises on errors, and lets the chunk size know how the request went """
+    failing = c.failing
+    try:
+        check_errors(c, engine_err, agent_err, agent_err_index, var_binds)
+    except (TooBigError, EngineError) as e:
+        chunk_failed(c, requested, e, failing)
+        raise e
+
+    c.chunk_size.succeeded(received, time.monotonic() - start)
+
+
+def is_end_of_mib(value) -> bool:
+    return isinstance(value, EndOfMibView) or value is END_OF_MIB
+
+
+@lru_cache(maxsize=1024)
+def parse_oid(oid: str) -> tuple[int]:
+    return tuple(int(i) for i in oid.split('.'))
+
+
+def to_oid(oid: str | tuple[int]) -> tuple[int]:
+    return parse_oid(oid) if isinstance(oid, str) else oid
+
+
+_mib_view = None
+_mib_lock = threading.Lock()
+
+
+@lru_cache(maxsize=OBJECT_CACHE_SIZE)
+def get_object_type(oid: tuple[int]) -> ObjectType:
+    """
+    Returns an ObjectType for the oid that was already resolved, so pysnmp doesn't have to look it up in its MIBs again
+    on every request. They're shared by every request, so don't change them.
+    """
+    global _mib_view
+    with _mib_lock:
+        if _mib_view is None:
+            _mib_view = MibViewController(SnmpEngine().getMibBuilder())
+        return ObjectType(ObjectIdentity(oid)).resolveWithMib(_mib_view)
+
+
+def get_object_types(oids) -> list[ObjectType]:
+    return [get_object_type(to_oid(oid)) for oid in oids]
+
+
 def process_value(var_bind) -> str | int | float | None:
     val = var_bind[1]
-    if isinstance(val, NoSuchInstance):
+    if val is None or type(val) in (int, str):
+        return val  # already converted by snmp_lite
+    elif isinstance(val, NoSuchInstance):
         return None
     elif isinstance(val, Integer) or isinstance(val, Integer32) or isinstance(val, Counter32):
         return int(val)
@@ -36,29 +255,44 @@ def process_value(var_bind) -> str | int | float | None:
         return val.prettyPrint()
 
 
-def snmp_get(c: SnmpConfiguration, oid: str | tuple[int]) -> str | int | float | None:
+def snmp_get(c: SnmpConfiguration, oid: str | tuple[int], deadline: Deadline | None = None) -> str | int | float | None:
     """ gets a single oid """
-    return snmp_get_all(c, oid)[0]
+    return snmp_get_all(c, oid, deadline=deadline)[0]
+
 
+def snmp_get_all(c: SnmpConfiguration, *oid: str | tuple[int], deadline: Deadline | None = None) -> list[str | int | float | None]:
+    """ does a bulk request, giving up with DeadlineExceeded past the deadline """
+    if c.is_async:
+        return c.engines.run(snmp_get_all_async(c, *oid, deadline=deadline))
 
-def snmp_get_all(c: SnmpConfiguration, *oid: str | tuple[int]) -> list[str | int | float | None]:
-    """ does a bulk request """
-    if len(oid) > MAX_CHUNK:
+    size = c.chunk_size.size
+    if len(oid) > size:
         # split it up to not break the target
         results = []
-        results.extend(snmp_get_all(c, *oid[:MAX_CHUNK]))
-        results.extend(snmp_get_all(c, *oid[MAX_CHUNK:]))
+        results.extend(snmp_get_all(c, *oid[:size], deadline=deadline))
+        results.extend(snmp_get_all(c, *oid[size:], deadline=deadline))
         return results
 
-    # do snmp get
-    it = getCmd(c.engine, c.auth, c.transport, c.context, *[ObjectType(ObjectIdentity(x)) for x in oid])
-    engine_err, agent_err, agent_err_index, var_binds = next(it)
+    # do snmp get. pysnmp's blocking api can't be cut short, so with it only new requests stop at the deadline
+    check_deadline(deadline)
+    c.check_circuit()
+    c.throttle(len(oid), deadline)
+    with c.engines.acquire() as engine:
+        c.count_pdu(len(oid))
+        start = time.monotonic()
+        if c.is_lite:
+            engine_err, agent_err, agent_err_index, var_binds = engine.get(c, [to_oid(x) for x in oid], deadline)
+        else:
+            engine_err, agent_err, agent_err_index, var_binds = next(getCmd(engine, c.auth, c.transport, c.context, *get_object_types(oid), lookupMib=False))
 
     # handle errors
-    if engine_err:
-        raise EngineError(engine_err)
-    elif agent_err:
-        raise AgentError('%s at %s' % (agent_err.prettyPrint(), var_binds[int(agent_err_index) - 1] if agent_err_index else '?'))
+    try:
+        check_response(c, len(oid), len(oid), start, engine_err, agent_err, agent_err_index, var_binds)
+    except TooBigError as e:
+        if len(oid) <= c.chunk_size.min_size:
+            raise e
+        # try again in smaller pieces
+        return snmp_get_all(c, *oid, deadline=deadline)
 
     # debugging
     # for var_bind in var_binds:
@@ -67,31 +301,365 @@ def snmp_get_all(c: SnmpConfiguration, *oid: str | tuple[int]) -> list[str | int
     return [process_value(vb) for vb in var_binds]
 
 
-def snmp_walk(c: SnmpConfiguration, base_oid: str) -> list[tuple[str, str | int | float | None]]:
-    """ does a walk within the range of a specified base oid """
+def snmp_walk(c: SnmpConfiguration, base_oid: str | tuple[int], deadline: Deadline | None = None) -> list[tuple[tuple[int], str | int | float | None]]:
+    """ does a walk within the range of a specified base oid, giving up with DeadlineExceeded past the deadline """
+    if c.is_async:
+        return c.engines.run(snmp_walk_async(c, base_oid, deadline))
+    elif c.is_lite:
+        return _lite_walk(c, base_oid, deadline)
+
+    base_oid = to_oid(base_oid)
     results = []
 
     # do snmp get
-    it = nextCmd(c.engine, c.auth, c.transport, c.context, ObjectType(ObjectIdentity(base_oid)))
-    within = True
-    while within:
-        engine_err, agent_err, agent_err_index, var_binds = next(it)
+    with c.engines.acquire() as engine:
+        it = nextCmd(engine, c.auth, c.transport, c.context, get_object_type(base_oid), lookupMib=False)
+        within = True
+        while within:
+            check_deadline(deadline)
+            c.check_circuit()
+            c.throttle(1, deadline)
+            c.count_pdu()
+            engine_err, agent_err, agent_err_index, var_binds = next(it)
 
-        # handle errors
-        if engine_err:
-            raise EngineError(engine_err)
-        elif agent_err:
-            raise AgentError('%s at %s' % (agent_err.prettyPrint(), var_binds[int(agent_err_index) - 1] if agent_err_index else '?'))
-
-        for var_bind in var_binds:
-            # print(var_bind)
-            oid = str(var_bind[0].getOid())
-            if oid.startswith(base_oid):
-                results.append((oid, process_value(var_bind)))
-            else:
+            # handle errors
+            check_errors(c, engine_err, agent_err, agent_err_index, var_binds)
+
+            for var_bind in var_binds:
+                # print(var_bind)
+                oid = tuple(var_bind[0])
+                if oid[:len(base_oid)] == base_oid:
+                    results.append((oid, process_value(var_bind)))
+                else:
+                    within = False
+
+            if len(var_binds) == 0:
                 within = False
 
+    return results
+
+
+def _lite_walk(c: SnmpConfiguration, base_oid: str | tuple[int], deadline: Deadline | None) -> list[tuple[tuple[int], str | int | float | None]]:
+    base = to_oid(base_oid)
+    oid = base
+    results = []
+    while True:
+        c.check_circuit()
+        c.throttle(1, deadline)
+        c.count_pdu()
+        engine_err, agent_err, agent_err_index, var_binds = c.engines.get_next(c, [oid], deadline)
+        check_errors(c, engine_err, agent_err, agent_err_index, var_binds)
         if len(var_binds) == 0:
-            within = False
+            break
+
+        oid, value = var_binds[0]
+        if is_end_of_mib(value) or oid[:len(base)] != base:
+            break
+        results.append((oid, value))
 
     return results
+
+
+def snmp_bulk_walk(c: SnmpConfiguration, base_oid: str | tuple[int], deadline: Deadline | None = None) -> list[tuple[tuple[int], str | int | float | None]]:
+    """
+    Does the same thing as snmp_walk, but asks for up to c.max_repetitions rows at a time with GETBULK instead of one
+    row per round trip. Falls back to snmp_walk if the agent doesn't play along.
+    """
+    if c.max_repetitions < 1:
+        return snmp_walk(c, base_oid, deadline)
+
+    try:
+        return _bulk_walk(c, base_oid, deadline)
+    except TooBigError as e:
+        raise e  # even a single row was too big, which GETNEXT can't help with
+    except (AgentError, WalkError) as e:
+        print('GETBULK walk of %s failed on %s, falling back to GETNEXT for this target: %s' % ('.'.join(map(str, to_oid(base_oid))), c.target, e))
+        c.max_repetitions = 0
+        return snmp_walk(c, base_oid, deadline)
+
+
+def _bulk_walk(c: SnmpConfiguration, base_oid: str | tuple[int], deadline: Deadline | None) -> list[tuple[tuple[int], str | int | float | None]]:
+    column = to_oid(base_oid)
+    rows = snmp_table(c, column, deadline=deadline)[column]
+    return [(column + index, value) for index, value in rows.items()]
+
+
+class TableSweep(object):
+    """ keeps track of a walk over several columns of a table at once, see snmp_table """
+    def __init__(self, columns: list[tuple[int]]):
+        self.results = {column: {} for column in columns}
+        self._active = {column: column for column in columns}  # {column: last oid}
+        self._limit = None  # var binds per request, once the agent said tooBig
+
+    @property
+    def done(self) -> bool:
+        return len(self._active) == 0
+
+    def next_request(self, c: SnmpConfiguration) -> tuple[list[tuple[int]], list[tuple[int]], int]:
+        """ returns the columns to ask for next, the oids to start from and how many rows to ask for """
+        size = c.chunk_size.size if self._limit is None else min(c.chunk_size.size, self._limit)
+        requested = list(self._active.keys())[:size]
+        repetitions = max(1, min(c.max_repetitions, size // len(requested)))
+        return requested, [self._active[column] for column in requested], repetitions
+
+    def too_big(self, var_binds: int) -> bool:
+        """ halves the requests after a tooBig for this many var binds, or returns False if they can't get smaller """
+        if var_binds <= 1:
+            return False
+        self._limit = var_binds // 2
+        return True
+
+    def add_rows(self, requested: list[tuple[int]], rows: list[list]):
+        if len(rows) == 0:
+            raise WalkError('agent returned no rows')
+
+        for row in rows:
+            for column, var_bind in zip(requested, row):
+                if column not in self._active:
+                    continue  # this column already ran off the end of the table
+
+                oid = tuple(var_bind[0])
+                if is_end_of_mib(var_bind[1]) or oid[:len(column)] != column:
+                    del self._active[column]
+                    continue
+                if oid <= self._active[column]:
+                    raise WalkError('agent returned %s after %s' % ('.'.join(map(str, oid)), '.'.join(map(str, self._active[column]))))
+
+                self._active[column] = oid
+                self.results[column][oid[len(column):]] = process_value(var_bind)
+
+
+def snmp_table(c: SnmpConfiguration, *columns: str | tuple[int], deadline: Deadline | None = None) -> dict[tuple[int], dict[tuple[int], str | int | float | None]]:
+    """
+    Walks several columns of a table at the same time, using GETBULK requests that ask for the next rows of every
+    column at once. Each request is kept to about c.chunk_size var binds, and at most c.max_repetitions rows. Requests
+    that get tooBig are asked again for fewer rows, down to a single var bind.
+    Returns {column: {row index: value}}, where the column and row index are oid tuples.
+    """
+    if c.is_async:
+        return c.engines.run(snmp_table_async(c, *columns, deadline=deadline))
+
+    sweep = TableSweep([to_oid(column) for column in columns])
+    with c.engines.acquire() as engine:
+        while not sweep.done:
+            requested, oids, repetitions = sweep.next_request(c)
+            try:
+                rows = _get_bulk(c, engine, oids, repetitions, deadline)
+            except TooBigError as e:
+                if not sweep.too_big(len(oids) * repetitions):
+                    raise e
+                continue
+            sweep.add_rows(requested, rows)
+
+    return sweep.results
+
+
+def _get_bulk(c: SnmpConfiguration, engine: SnmpEngine | LiteClient, oids: list[tuple[int]], max_repetitions: int, deadline: Deadline | None) -> list[list]:
+    """ does a single GETBULK request and returns the rows of var binds """
+    check_deadline(deadline)
+    c.check_circuit()
+    c.throttle(len(oids) * max_repetitions, deadline)
+    if c.is_lite:
+        c.count_pdu(len(oids) * max_repetitions)
+        start = time.monotonic()
+        engine_err, agent_err, agent_err_index, rows = engine.get_bulk(c, oids, max_repetitions, deadline)
+        check_response(c, len(oids) * max_repetitions, sum(len(row) for row in rows), start, engine_err, agent_err, agent_err_index, rows[0] if rows else [])
+        return rows
+
+    rows = []
+    it = bulkCmd(engine, c.auth, c.transport, c.context, 0, max_repetitions, *get_object_types(oids), maxCalls=1, lookupMib=False)
+    c.count_pdu(len(oids) * max_repetitions)
+    start = time.monotonic()
+    failing = c.failing
+    for engine_err, agent_err, agent_err_index, var_binds in it:
+
+        # handle errors
+        try:
+            check_errors(c, engine_err, agent_err, agent_err_index, var_binds)
+        except (TooBigError, EngineError) as e:
+            chunk_failed(c, len(oids) * max_repetitions, e, failing)
+            raise e
+
+        rows.append(var_binds)
+
+    # the end of a table comes back short, which succeeded() knows to ignore
+    c.chunk_size.succeeded(sum(len(row) for row in rows), time.monotonic() - start)
+    return rows
+
+
+class RequestPlan(object):
+    """
+    Gathers up the values wanted by several collectors so they can all be fetched with as few GET requests as
+    possible, instead of at least one request per column. The results come back in the same shape as snmp_table.
+    With partial, requests that run out of time are left out of the results instead of failing all of them, and
+    is_complete() tells whether everything a plan wanted made it.
+    """
+    def __init__(self):
+        self._oids = {}  # {oid: (column, index)}, also gets rid of duplicates
+
+    def __len__(self) -> int:
+        return len(self._oids)
+
+    def add(self, column: tuple[int], indexes: list):
+        for index in indexes:
+            if not isinstance(index, tuple):
+                index = (index,)
+            self._oids[column + index] = (column, index)
+
+    def extend(self, other: 'RequestPlan'):
+        self._oids.update(other._oids)
+
+    def is_complete(self, table: dict[tuple[int], dict[tuple[int], any]]) -> bool:
+        """ whether the results of some execute() have every value this plan wants """
+        return all(index in table.get(column, {}) for column, index in self._oids.values())
+
+    def get_chunks(self, max_size: int) -> list[list[tuple[int]]]:
+        """ splits the oids into the fewest requests allowed by max_size, all about the same size """
+        oids = list(self._oids.keys())
+        if len(oids) == 0:
+            return []
+
+        size = math.ceil(len(oids) / math.ceil(len(oids) / max_size))
+        return [oids[i:i + size] for i in range(0, len(oids), size)]
+
+    def execute(self, c: SnmpConfiguration, map_function=map, deadline: Deadline | None = None, partial: bool = False) -> dict[tuple[int], dict[tuple[int], str | int | float | None]]:
+        """ map_function can be swapped out to send the requests at the same time """
+        if c.is_async:
+            return c.engines.run(self.execute_async(c, deadline, partial))
+
+        def fetch(chunk: list[tuple[int]]) -> list | None:
+            try:
+                return snmp_get_all(c, *chunk, deadline=deadline)
+            except DeadlineExceeded as e:
+                if not partial:
+                    raise e
+                return None
+
+        chunks = self.get_chunks(c.chunk_size.size)
+        return self._scatter(chunks, map_function(fetch, chunks))
+
+    async def execute_async(self, c: SnmpConfiguration, deadline: Deadline | None = None, partial: bool = False) -> dict[tuple[int], dict[tuple[int], str | int | float | None]]:
+        async def fetch(chunk: list[tuple[int]]) -> list | None:
+            try:
+                return await snmp_get_all_async(c, *chunk, deadline=deadline)
+            except DeadlineExceeded as e:
+                if not partial:
+                    raise e
+                return None
+
+        chunks = self.get_chunks(c.chunk_size.size)
+        return self._scatter(chunks, await asyncio.gather(*[fetch(chunk) for chunk in chunks]))
+
+    def _scatter(self, chunks: list[list[tuple[int]]], results: list[list | None]) -> dict[tuple[int], dict[tuple[int], str | int | float | None]]:
+        """ puts the results of each chunk in a table, skipping the ones that ran out of time """
+        table = {}
+        for chunk, chunk_results in zip(chunks, results):
+            if chunk_results is None:
+                continue
+            for oid, value in zip(chunk, chunk_results):
+                column, index = self._oids[oid]
+                table.setdefault(column, {})[index] = value
+
+        return table
+
+
+# asyncio versions of the above, for use with an AsyncEngine. Requests to a target are limited to c.window at a time,
+# anything past that waits its turn instead of going out all at once, after waiting out the rate limits. Requests still
+# waiting on the ILO at the deadline are given up on.
+
+async def _until(deadline: Deadline | None, coroutine):
+    """ awaits the coroutine until the deadline, then raises DeadlineExceeded """
+    try:
+        return await asyncio.wait_for(coroutine, time_left(deadline, None))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded('ran out of time')
+
+
+async def snmp_get_all_async(c: SnmpConfiguration, *oid: str | tuple[int], deadline: Deadline | None = None) -> list[str | int | float | None]:
+    """ does a bulk request, sending the chunks at the same time """
+    size = c.chunk_size.size
+    chunks = [oid[i:i + size] for i in range(0, len(oid), size)]
+    results = []
+    for chunk_results in await asyncio.gather(*[_get_async(c, chunk, deadline) for chunk in chunks]):
+        results.extend(chunk_results)
+    return results
+
+
+async def _get_async(c: SnmpConfiguration, oids: tuple, deadline: Deadline | None) -> list[str | int | float | None]:
+    from pysnmp.hlapi.asyncio import getCmd as async_get_cmd
+
+    await c.throttle_async(len(oids), deadline)
+    async with c.window:
+        c.check_circuit()
+        c.count_pdu(len(oids))
+        start = time.monotonic()
+        engine_err, agent_err, agent_err_index, var_binds = await _until(deadline, async_get_cmd(c.engines.engine, c.auth, c.async_transport, c.context, *get_object_types(oids), lookupMib=False))
+
+    try:
+        check_response(c, len(oids), len(oids), start, engine_err, agent_err, agent_err_index, var_binds)
+    except TooBigError as e:
+        if len(oids) <= c.chunk_size.min_size:
+            raise e
+        # try again in smaller pieces
+        return await snmp_get_all_async(c, *oids, deadline=deadline)
+
+    return [process_value(vb) for vb in var_binds]
+
+
+async def snmp_walk_async(c: SnmpConfiguration, base_oid: str | tuple[int], deadline: Deadline | None = None) -> list[tuple[tuple[int], str | int | float | None]]:
+    """ does a walk within the range of a specified base oid, one GETNEXT at a time """
+    from pysnmp.hlapi.asyncio import nextCmd as async_next_cmd
+
+    base = to_oid(base_oid)
+    oid = base
+    results = []
+    while True:
+        await c.throttle_async(1, deadline)
+        async with c.window:
+            c.check_circuit()
+            c.count_pdu()
+            engine_err, agent_err, agent_err_index, var_bind_table = await _until(deadline, async_next_cmd(c.engines.engine, c.auth, c.async_transport, c.context, get_object_type(oid), lookupMib=False))
+
+        var_binds = var_bind_table[0] if var_bind_table else []
+        check_errors(c, engine_err, agent_err, agent_err_index, var_binds)
+        if len(var_binds) == 0:
+            break
+
+        var_bind = var_binds[0]
+        oid = tuple(var_bind[0])
+        if is_end_of_mib(var_bind[1]) or oid[:len(base)] != base:
+            break
+        results.append((oid, process_value(var_bind)))
+
+    return results
+
+
+async def snmp_table_async(c: SnmpConfiguration, *columns: str | tuple[int], deadline: Deadline | None = None) -> dict[tuple[int], dict[tuple[int], str | int | float | None]]:
+    """ see snmp_table """
+    sweep = TableSweep([to_oid(column) for column in columns])
+    while not sweep.done:
+        requested, oids, repetitions = sweep.next_request(c)
+        try:
+            rows = await _get_bulk_async(c, oids, repetitions, deadline)
+        except TooBigError as e:
+            if not sweep.too_big(len(oids) * repetitions):
+                raise e
+            continue
+        sweep.add_rows(requested, rows)
+
+    return sweep.results
+
+
+async def _get_bulk_async(c: SnmpConfiguration, oids: list[tuple[int]], max_repetitions: int, deadline: Deadline | None) -> list[list]:
+    from pysnmp.hlapi.asyncio import bulkCmd as async_bulk_cmd
+
+    await c.throttle_async(len(oids) * max_repetitions, deadline)
+    async with c.window:
+        c.check_circuit()
+        c.count_pdu(len(oids) * max_repetitions)
+        start = time.monotonic()
+        engine_err, agent_err, agent_err_index, rows = await _until(deadline, async_bulk_cmd(c.engines.engine, c.auth, c.async_transport, c.context, 0, max_repetitions, *get_object_types(oids), lookupMib=False))
+
+    var_binds = rows[0] if rows else []
+    check_response(c, len(oids) * max_repetitions, sum(len(row) for row in rows), start, engine_err, agent_err, agent_err_index, var_binds)
+    return rows
@@ -1,43 +1,92 @@
-from snmp import SnmpConfiguration, snmp_get_all
+from snmp import SnmpConfiguration, snmp_get_all, parse_oid
 
+from array import array
+import sys
+import threading
+import time
 
-class EnumMapping(object):
-    def __init__(self, value: int, value_map: dict[int, str]):
-        self._value = value
-        self._value_map = value_map
+# how often the values of a column change, which decides how long they can be cached for
+STATIC = 'static'  # inventory, like serial numbers. only changes when hardware is swapped
+SLOW = 'slow'  # things like thresholds and link rates
+VOLATILE = 'volatile'  # readings and statuses, always fetched
+
+# default seconds to cache each volatility class for. static columns are also fetched again when the indexes change
+TTLS = {
+    STATIC: 3600,
+    SLOW: 300,
+    VOLATILE: 0,
+}
+
+
+class TableFrame(object):
+    """
+    The values of a table for a single collection, kept as one list per column in the same order as indexes, instead
+    of a dict per column. rows() gives a view of each row.
+    """
+    __slots__ = ('indexes', 'columns')
+
+    def __init__(self, indexes: list):
+        self.indexes = indexes
+        self.columns = {}  # {name: [value of each index]}
+
+    def add(self, name: str, values):
+        self.columns[name] = values
 
-    def get_value(self) -> int:
-        return self._value
+    def rows(self):
+        for position in range(len(self.indexes)):
+            yield FrameRow(self, position)
 
-    def get_name(self) -> str | None:
-        if self._value not in self._value_map.keys():
-            return None
-        return self._value_map[self._value]
 
-    def __str__(self) -> str:
-        name = self.get_name()
-        if name is None:
-            return 'unknown state %i' % self._value
-        return name
+class FrameRow(object):
+    __slots__ = ('_frame', '_position')
+
+    def __init__(self, frame: TableFrame, position: int):
+        self._frame = frame
+        self._position = position
+
+    @property
+    def index(self):
+        return self._frame.indexes[self._position]
+
+    def __getitem__(self, name: str):
+        return self._frame.columns[name][self._position]
 
 
 class BulkValues(object):
-    def __init__(self, oid_template, name: str):
-        self._oid_template = oid_template
+    def __init__(self, column: str | None, name: str, volatility: str = VOLATILE):
+        self._column = None if column is None else parse_oid(column)
         self._name = name
+        self.volatility = volatility
 
     @property
     def name(self):
         return self._name
 
-    def get_values(self, c: SnmpConfiguration, indexes: list) -> dict:
-        oids = [self._oid_template(index) for index in indexes]
-        results = snmp_get_all(c, *oids)
-        result_dict = {}
-        for index in indexes:
-            result_dict[index] = results.pop(0)
+    @property
+    def column(self) -> tuple[int] | None:
+        """ the oid of the table column these values are read from, the index is appended to it """
+        return self._column
 
-        return result_dict
+    def get_oid(self, index: int | tuple[int]) -> tuple[int]:
+        if isinstance(index, tuple):
+            return self._column + index
+        return self._column + (index,)
+
+    def get_column(self, c: SnmpConfiguration, indexes: list) -> list:
+        """ asks the ilo for the values of each index, in the same order """
+        return self._convert(snmp_get_all(c, *[self.get_oid(index) for index in indexes]))
+
+    def read_column(self, table: dict[tuple[int], dict], indexes: list) -> list:
+        """ does the same as get_column, but reads from the result of snmp_table or a RequestPlan instead """
+        column = table.get(self._column, {})
+        return self._convert([column.get(index if isinstance(index, tuple) else (index,)) for index in indexes])
+
+    def read_labels(self, table: dict[tuple[int], dict], indexes: list) -> list[str]:
+        """ same as read_column, but as label values """
+        return [str(value) for value in self.read_column(table, indexes)]
+
+    def _convert(self, values: list) -> list:
+        return values
 
 
 class BulkDummyValue(BulkValues):
@@ -45,12 +94,11 @@ class BulkDummyValue(BulkValues):
         super().__init__(None, name)
         self._name = name
 
-    def get_values(self, _: SnmpConfiguration, indexes: list) -> dict:
-        result_dict = {}
-        for index in indexes:
-            result_dict[index] = 1
+    def get_column(self, _: SnmpConfiguration, indexes: list) -> list:
+        return [1] * len(indexes)
 
-        return result_dict
+    def read_column(self, _: dict, indexes: list) -> list:
+        return [1] * len(indexes)
 
 
 class BulkPredeterminedValues(BulkValues):
@@ -59,52 +107,102 @@ class BulkPredeterminedValues(BulkValues):
         self._name = name
         self.values = values
 
-    def get_values(self, c: SnmpConfiguration, indexes: list) -> dict:
-        return self.values
+    def get_column(self, c: SnmpConfiguration, indexes: list) -> list:
+        return self.read_column(None, indexes)
+
+    def read_column(self, _: dict, indexes: list) -> list:
+        values = self.values
+        return [values.get(index) for index in indexes]
 
 
 class BulkNumbers(BulkValues):
-    def __init__(self, oid_template, name: str):
-        super().__init__(oid_template, name)
+    def __init__(self, column: str, name: str, volatility: str = VOLATILE):
+        super().__init__(column, name, volatility)
 
-    def get_values(self, c: SnmpConfiguration, indexes: list) -> dict:
-        result_dict = super().get_values(c, indexes)
-        for key in result_dict.keys():
-            if not isinstance(result_dict[key], int):
-                result_dict[key] = -1
-                print('unknown value (not an int):', result_dict[key])
-        return result_dict
+    def read_column(self, table: dict[tuple[int], dict], indexes: list) -> array:
+        # the numbers only ever end up as floats in the metrics
+        return array('d', super().read_column(table, indexes))
+
+    def read_labels(self, table: dict[tuple[int], dict], indexes: list) -> list[str]:
+        return [str(value) for value in super().read_column(table, indexes)]
+
+    def _convert(self, values: list) -> list:
+        for i, value in enumerate(values):
+            if not isinstance(value, int):
+                print('unknown value (not an int):', value)
+                values[i] = -1
+        return values
 
 
 class BulkEnums(BulkNumbers):
-    def __init__(self, oid_template, name: str, value_map: dict):
-        super().__init__(oid_template, name)
+    def __init__(self, column: str, name: str, value_map: dict, volatility: str = VOLATILE):
+        super().__init__(column, name, volatility)
         self._value_map = value_map
+        # every possible label is made once, so each cell is just a lookup
+        self._labels = {value: sys.intern(label) for value, label in value_map.items()}
 
     @property
     def state_map(self):
         return self._value_map
 
-    def get_values(self, c: SnmpConfiguration, indexes: list) -> dict:
-        result_dict = super().get_values(c, indexes)
-        for key in result_dict.keys():
-            value = result_dict[key]
-            result_dict[key] = EnumMapping(value, self._value_map)
-            if __debug__ and value not in self._value_map:
-                print('unexpected enum value from ilo for %s: %i' % (self.name, value))
-        return result_dict
+    def _get_label(self, value: int) -> str:
+        label = self._labels.get(value)
+        if label is None:
+            print('unexpected enum value from ilo for %s: %i' % (self.name, value))
+            label = self._labels.setdefault(value, sys.intern('unknown state %i' % value))
+        return label
+
+    def read_labels(self, table: dict[tuple[int], dict], indexes: list) -> list[str]:
+        labels = self._labels
+        return [labels.get(value) or self._get_label(value) for value in BulkValues.read_column(self, table, indexes)]
 
 
 class BulkStrings(BulkValues):
-    def __init__(self, oid_template, name: str):
-        super().__init__(oid_template, name)
-
-    def get_values(self, c: SnmpConfiguration, indexes: list) -> dict:
-        result_dict = super().get_values(c, indexes)
-        for key in result_dict.keys():
-            if not isinstance(result_dict[key], str):
-                result_dict[key] = 'unknown value: %s' % str(result_dict[key])
-                print('unknown value (not a string):', result_dict[key])
+    def __init__(self, column: str, name: str, volatility: str = VOLATILE):
+        super().__init__(column, name, volatility)
+
+    def read_labels(self, table: dict[tuple[int], dict], indexes: list) -> list[str]:
+        return self.read_column(table, indexes)
+
+    def _convert(self, values: list) -> list:
+        for i, value in enumerate(values):
+            if not isinstance(value, str):
+                values[i] = 'unknown value: %s' % str(value)
+                print('unknown value (not a string):', values[i])
             else:
-                result_dict[key] = result_dict[key].strip()
-        return result_dict
+                values[i] = value.strip()
+        return values
+
+
+class ColumnCache(object):
+    """
+    Remembers the fetched values of table columns that don't change often, so they only have to be fetched again once
+    they expire, or the indexes of the table change.
+    """
+    def __init__(self, ttls: dict[str, float] = TTLS):
+        self._ttls = ttls
+        self._columns = {}  # {column: (indexes, expiry time, {index: value})}
+        self._lock = threading.Lock()
+
+    def get_ttl(self, volatility: str) -> float:
+        return self._ttls.get(volatility, 0)
+
+    def is_cached(self, column: tuple[int], indexes: list) -> bool:
+        with self._lock:
+            entry = self._columns.get(column)
+        return entry is not None and entry[0] == tuple(indexes) and entry[1] > time.monotonic()
+
+    def update(self, table: dict[tuple[int], dict], ttls: dict[tuple[int], float], indexes: list) -> dict[tuple[int], dict]:
+        """ remembers the columns of ttls that were fetched into table, and returns a table with the rest filled in """
+        table = dict(table)
+        now = time.monotonic()
+        with self._lock:
+            for column, ttl in ttls.items():
+                if ttl <= 0:
+                    continue
+                if column in table:
+                    self._columns[column] = (tuple(indexes), now + ttl, table[column])
+                elif column in self._columns:
+                    table[column] = self._columns[column][2]
+
+        return table
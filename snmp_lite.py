@@ -0,0 +1,316 @@
+# a tiny SNMP v2c client that only knows GET, GETNEXT and GETBULK, for when pysnmp is too heavy
+
+from deadline import Deadline, check_deadline, time_left
+
+from contextlib import contextmanager
+import itertools
+import random
+import selectors
+import socket
+import threading
+
+VERSION_2C = 1
+
+# pdu types
+GET = 0xa0
+GET_NEXT = 0xa1
+RESPONSE = 0xa2
+GET_BULK = 0xa5
+
+# ber tags
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OBJECT_IDENTIFIER = 0x06
+SEQUENCE = 0x30
+IP_ADDRESS = 0x40
+COUNTER32 = 0x41
+GAUGE32 = 0x42
+TIME_TICKS = 0x43
+OPAQUE = 0x44
+COUNTER64 = 0x46
+NO_SUCH_OBJECT = 0x80
+NO_SUCH_INSTANCE = 0x81
+END_OF_MIB_VIEW = 0x82
+
+ERROR_NAMES = [
+    'noError', 'tooBig', 'noSuchName', 'badValue', 'readOnly', 'genErr', 'noAccess', 'wrongType', 'wrongLength',
+    'wrongEncoding', 'wrongValue', 'noCreation', 'inconsistentValue', 'resourceUnavailable', 'commitFailed',
+    'undoFailed', 'authorizationError', 'notWritable', 'inconsistentName',
+]
+
+TIMEOUT_ERROR = 'No SNMP response received before timeout'
+
+
+class EndOfMibView(object):
+    """ the value of var binds past the end of everything """
+    def __repr__(self) -> str:
+        return 'endOfMibView'
+
+
+END_OF_MIB = EndOfMibView()
+
+
+class ErrorStatus(int):
+    """ an int that prints like pysnmp's error statuses """
+    def prettyPrint(self) -> str:
+        return ERROR_NAMES[self] if self < len(ERROR_NAMES) else str(int(self))
+
+
+class DecodeError(Exception):
+    pass
+
+
+# encoding
+
+def encode_length(length: int) -> bytes:
+    if length < 0x80:
+        return bytes([length])
+    raw = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(raw)]) + raw
+
+
+def encode_tlv(tag: int, value: bytes) -> bytes:
+    return bytes([tag]) + encode_length(len(value)) + value
+
+
+def encode_integer(value: int) -> bytes:
+    return encode_tlv(INTEGER, value.to_bytes(value.bit_length() // 8 + 1, 'big', signed=True))
+
+
+def encode_oid(oid: tuple[int]) -> bytes:
+    raw = bytearray()
+    # the first two arcs share the first subidentifier, which can take more than a byte like any other
+    for arc in (oid[0] * 40 + oid[1], *oid[2:]):
+        chunk = [arc & 0x7f]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7f))
+            arc >>= 7
+        raw.extend(reversed(chunk))
+    return encode_tlv(OBJECT_IDENTIFIER, bytes(raw))
+
+
+def encode_value(value: str | int | None | EndOfMibView) -> bytes:
+    if value is None:
+        return encode_tlv(NO_SUCH_INSTANCE, b'')
+    elif value is END_OF_MIB:
+        return encode_tlv(END_OF_MIB_VIEW, b'')
+    elif isinstance(value, int):
+        return encode_integer(value)
+    return encode_tlv(OCTET_STRING, value.encode('iso-8859-1'))
+
+
+def encode_message(community: bytes, pdu_type: int, request_id: int, field1: int, field2: int, var_binds: list[tuple[tuple[int], any]]) -> bytes:
+    """
+    Builds a whole v2c message. field1 and field2 are the error status and index, or non repeaters and max repetitions
+    for GETBULK. Values in requests are None, which are sent as NULL.
+    """
+    encoded = b''.join(encode_tlv(SEQUENCE, encode_oid(oid) + (b'\x05\x00' if pdu_type != RESPONSE else encode_value(value))) for oid, value in var_binds)
+    pdu = encode_tlv(pdu_type, encode_integer(request_id) + encode_integer(field1) + encode_integer(field2) + encode_tlv(SEQUENCE, encoded))
+    return encode_tlv(SEQUENCE, encode_integer(VERSION_2C) + encode_tlv(OCTET_STRING, community) + pdu)
+
+
+def encode_request(community: bytes, pdu_type: int, request_id: int, oids: list[tuple[int]], non_repeaters: int = 0, max_repetitions: int = 0) -> bytes:
+    return encode_message(community, pdu_type, request_id, non_repeaters, max_repetitions, [(oid, None) for oid in oids])
+
+
+# decoding
+
+def decode_tlv(data: bytes, offset: int) -> tuple[int, int, int]:
+    """ returns the tag, and where its value starts and ends """
+    try:
+        tag = data[offset]
+        length = data[offset + 1]
+        offset += 2
+        if length & 0x80:
+            size = length & 0x7f
+            length = int.from_bytes(data[offset:offset + size], 'big')
+            offset += size
+    except IndexError:
+        raise DecodeError('truncated message')
+
+    if offset + length > len(data):
+        raise DecodeError('truncated message')
+    return tag, offset, offset + length
+
+
+def decode_oid(raw: bytes) -> tuple[int]:
+    if len(raw) == 0 or raw[-1] & 0x80:
+        raise DecodeError('empty or truncated oid')
+    subidentifiers = []
+    arc = 0
+    for byte in raw:
+        arc = (arc << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            subidentifiers.append(arc)
+            arc = 0
+
+    first = min(subidentifiers[0] // 40, 2)
+    return (first, subidentifiers[0] - first * 40, *subidentifiers[1:])
+
+
+def decode_value(tag: int, raw: bytes) -> str | int | None | EndOfMibView:
+    """ decodes straight to what snmp.process_value would make of it """
+    if tag == INTEGER:
+        return int.from_bytes(raw, 'big', signed=True)
+    elif tag in (COUNTER32, GAUGE32, TIME_TICKS, COUNTER64):
+        return int.from_bytes(raw, 'big')
+    elif tag in (OCTET_STRING, OPAQUE):
+        return raw.decode('iso-8859-1')
+    elif tag == IP_ADDRESS:
+        return '.'.join(str(b) for b in raw)
+    elif tag == OBJECT_IDENTIFIER:
+        return '.'.join(map(str, decode_oid(raw)))
+    elif tag in (NO_SUCH_OBJECT, NO_SUCH_INSTANCE, NULL):
+        return None
+    elif tag == END_OF_MIB_VIEW:
+        return END_OF_MIB
+    raise DecodeError('unknown type 0x%02x' % tag)
+
+
+def decode_message(data: bytes) -> tuple[bytes, int, int, int, int, list[tuple[tuple[int], any]]]:
+    """ returns the community, pdu type, request id, the two fields after it and the var binds of a message """
+    _, start, _ = decode_tlv(data, 0)  # message
+    _, _, start = decode_tlv(data, start)  # version
+    _, community_start, start = decode_tlv(data, start)
+    community = data[community_start:start]
+    pdu_type, start, _ = decode_tlv(data, start)
+
+    fields = []
+    for _ in range(3):
+        tag, value_start, start = decode_tlv(data, start)
+        fields.append(int.from_bytes(data[value_start:start], 'big', signed=True))
+
+    var_binds = []
+    tag, start, end = decode_tlv(data, start)
+    while start < end:
+        _, bind_start, start = decode_tlv(data, start)
+        tag, oid_start, oid_end = decode_tlv(data, bind_start)
+        tag, value_start, value_end = decode_tlv(data, oid_end)
+        var_binds.append((decode_oid(data[oid_start:oid_end]), decode_value(tag, data[value_start:value_end])))
+
+    request_id, field1, field2 = fields
+    return community, pdu_type, request_id, field1, field2, var_binds
+
+
+def decode_response(data: bytes) -> tuple[int, ErrorStatus, int, list[tuple[tuple[int], any]]]:
+    """ returns the request id, error status, error index and var binds of a response """
+    _, pdu_type, request_id, error_status, error_index, var_binds = decode_message(data)
+    if pdu_type != RESPONSE:
+        raise DecodeError('not a response')
+    return request_id, ErrorStatus(error_status), error_index, var_binds
+
+
+class _Pending(object):
+    def __init__(self, address: tuple):
+        self.address = address
+        self.response = None
+        self.size = 0  # bytes in the response
+        self.event = threading.Event()
+
+
+class LiteClient(object):
+    """
+    The requests this exporter needs, on top of request(), which subclasses fill in with however they get answers.
+    The results look like what pysnmp's getCmd gives, except values are already converted to python types.
+    """
+    @contextmanager
+    def acquire(self):
+        """ same as EnginePool.acquire, except everyone shares this one """
+        yield self
+
+    def request(self, c, pdu_type: int, oids: list[tuple[int]], max_repetitions: int = 0, deadline: Deadline | None = None) -> tuple:
+        """ returns engine error, agent error, agent error index and var binds, same as pysnmp """
+        raise NotImplementedError()
+
+    def get(self, c, oids: list[tuple[int]], deadline: Deadline | None = None) -> tuple:
+        return self.request(c, GET, oids, 0, deadline)
+
+    def get_next(self, c, oids: list[tuple[int]], deadline: Deadline | None = None) -> tuple:
+        return self.request(c, GET_NEXT, oids, 0, deadline)
+
+    def get_bulk(self, c, oids: list[tuple[int]], max_repetitions: int, deadline: Deadline | None = None) -> tuple:
+        """ same as get, except the var binds are split up into rows """
+        engine_err, agent_err, agent_err_index, var_binds = self.request(c, GET_BULK, oids, max_repetitions, deadline)
+        rows = [var_binds[i:i + len(oids)] for i in range(0, len(var_binds), len(oids))]
+        return engine_err, agent_err, agent_err_index, rows
+
+
+class LiteEngine(LiteClient):
+    """
+    Sends requests for every target from a single non-blocking UDP socket. A thread of its own reads the responses,
+    and hands each one to whoever is waiting on its request id. Requests are sent again after the timeout of the
+    target's transport, as many times as its retries allow, but never waited on past the deadline.
+    """
+    def __init__(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._pending = {}  # {request id: _Pending}
+        self._lock = threading.Lock()
+        self._request_ids = itertools.count(random.randrange(1, 2 ** 30))
+        threading.Thread(target=self._receive, name='snmp-lite', daemon=True).start()
+
+    def _next_request_id(self) -> int:
+        return next(self._request_ids) % (2 ** 31 - 1) + 1
+
+    def _receive(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._socket, selectors.EVENT_READ)
+        while True:
+            selector.select()
+            while True:
+                try:
+                    data, address = self._socket.recvfrom(65535)
+                except BlockingIOError:
+                    break
+                except OSError:
+                    continue  # icmp errors from earlier sends and such
+
+                try:
+                    response = decode_response(data)
+                except DecodeError as e:
+                    print('ignoring bad SNMP response from', address, e)
+                    continue
+
+                with self._lock:
+                    pending = self._pending.get(response[0])
+                if pending is None or pending.address[:2] != address[:2]:
+                    continue  # a late answer to a retried request, or someone else entirely
+
+                pending.response = response[1:]
+                pending.size = len(data)
+                pending.event.set()
+
+    def request(self, c, pdu_type: int, oids: list[tuple[int]], max_repetitions: int = 0, deadline: Deadline | None = None) -> tuple:
+        """ returns engine error, agent error, agent error index and var binds, same as pysnmp """
+        check_deadline(deadline)
+        address = c.transport.transportAddr
+        request_id = self._next_request_id()
+        community = c.auth.communityName
+        community = community.encode() if isinstance(community, str) else bytes(community)
+        message = encode_request(community, pdu_type, request_id, oids, 0, max_repetitions)
+
+        pending = _Pending(address)
+        with self._lock:
+            self._pending[request_id] = pending
+        sent = 0
+        try:
+            for _ in range(c.transport.retries + 1):
+                try:
+                    self._socket.sendto(message, address)
+                except BlockingIOError:
+                    pass  # the buffer is full, count it as lost
+                sent += 1
+                if pending.event.wait(time_left(deadline, c.transport.timeout)):
+                    break
+                check_deadline(deadline)
+            else:
+                return TIMEOUT_ERROR, 0, 0, []
+        finally:
+            with self._lock:
+                del self._pending[request_id]
+            c.stats.count(snmp_sent_bytes=len(message) * sent, snmp_received_bytes=pending.size, snmp_retries=sent - 1)
+
+        error_status, error_index, var_binds = pending.response
+        return None, error_status, error_index, var_binds
@@ -0,0 +1,123 @@
+# serves the last good metrics of an ILO that is slow or unreachable, while trying it again in the background
+
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from orchestrator import ScrapeOrchestrator
+from poller import Snapshot
+from deadline import current_deadline, time_left
+from instrumentation import get_collector_name
+from breaker import CircuitOpenError
+
+from concurrent.futures import Future, TimeoutError
+import threading
+import time
+import traceback
+
+
+class StaleWhileRevalidate(Collector):
+    """
+    Scrapes the ILO through the orchestrator like usual, and keeps the metric families of each collector that finished.
+    When a scrape fails or a collector runs out of time, the ILO counts as degraded: from then on, scrapes are answered
+    right away with the last good families of each collector, as long as they aren't older than max_age, while the ILO
+    is scraped again in the background, without a deadline. That way a hung ILO isn't waited on by every scrape. Once a
+    background scrape gets everything, scrapes go back to asking the ILO.
+    Scrapes only wait on the background scrape when there's nothing to serve in the meantime.
+    """
+    def __init__(self, orchestrator: ScrapeOrchestrator, max_age: float):
+        self._orchestrator = orchestrator
+        self._max_age = max_age
+        self._snapshots = {}  # {collector: Snapshot}, with monotonic timestamps
+        self._degraded = False
+        self._refresh = None  # Future of the background scrape going on, if any
+        self._lock = threading.Lock()
+
+    def _keep(self, results: dict) -> bool:
+        """ keeps the families of each collector that finished, and returns whether all of them did """
+        now = time.monotonic()
+        for collector, families in results.items():
+            self._snapshots[collector] = Snapshot(tuple(families), now)
+        return len(results) == len(self._orchestrator.collectors)
+
+    def _start_refresh(self) -> Future:
+        with self._lock:
+            self._degraded = True
+            if self._refresh is None:
+                self._refresh = Future()
+                threading.Thread(target=self._run_refresh, args=(self._refresh,), name='refresh', daemon=True).start()
+            return self._refresh
+
+    def _run_refresh(self, future: Future):
+        recovered = False
+        try:
+            recovered = self._keep(self._orchestrator.scrape(self._orchestrator.collectors))
+        except CircuitOpenError as e:
+            print('failed to refresh %s in the background: %s' % (self._orchestrator.target, e))  # nothing new to trace
+        except Exception as e:
+            print('failed to refresh', self._orchestrator.target, 'in the background')
+            traceback.print_exception(e)
+        finally:
+            with self._lock:
+                self._refresh = None
+                self._degraded = not recovered
+            future.set_result(recovered)
+
+    def _has_fresh_enough(self) -> bool:
+        now = time.monotonic()
+        return any(now - snapshot.timestamp <= self._max_age for snapshot in self._snapshots.values())
+
+    def _scrape(self) -> dict:
+        """ returns the families of each collector that finished, which is none of them while degraded """
+        deadline = current_deadline()
+        if self._degraded:
+            refresh = self._start_refresh()
+            if not self._has_fresh_enough():
+                try:
+                    refresh.result(timeout=time_left(deadline, None))
+                except TimeoutError:
+                    pass
+            return {}
+
+        try:
+            results = self._orchestrator.scrape_all(deadline)
+        except Exception as e:
+            self._start_refresh()
+            if not self._has_fresh_enough():
+                raise e  # nothing to serve instead, so fail like usual
+            print('failed to scrape %s, serving the last good metrics while retrying in the background' % self._orchestrator.target)
+            if isinstance(e, CircuitOpenError):
+                print(e)
+            else:
+                traceback.print_exception(e)
+            return {}
+
+        if not self._keep(results):
+            self._start_refresh()
+        return results
+
+    def collect(self):
+        results = self._scrape()
+
+        now = time.monotonic()
+        age = GaugeMetricFamily('ilo_exporter_stale_seconds', 'Seconds since the metrics served for each collector were fetched from the ILO, 0 when they were fetched by this scrape', labels=['collector'])
+        ages = {}
+        for collector in self._orchestrator.collectors:
+            if collector in results:
+                yield from results[collector]
+                seconds = 0
+            else:
+                snapshot = self._snapshots.get(collector)
+                if snapshot is None or now - snapshot.timestamp > self._max_age:
+                    continue  # too old to pass off as the ILO's current state
+                yield from snapshot.families
+                seconds = now - snapshot.timestamp
+
+            # collectors can share a name, so the oldest one counts
+            name = get_collector_name(collector)
+            ages[name] = max(seconds, ages.get(name, 0))
+
+        yield from self._orchestrator.collect_status()
+
+        for name, seconds in ages.items():
+            age.add_metric([name], seconds)
+        yield age
@@ -1,24 +1,27 @@
-from snmp_groups import BulkEnums, BulkNumbers, BulkStrings
+from snmp_groups import BulkEnums, BulkNumbers, BulkStrings, STATIC, SLOW
 
 CPU_INDEX = '1.3.6.1.4.1.232.1.2.2.1.1.1'
 
 CPU_NAME = BulkStrings(
-    (lambda i: '1.3.6.1.4.1.232.1.2.2.1.1.3.%i' % i),
+    '1.3.6.1.4.1.232.1.2.2.1.1.3',
     'name',
+    volatility=STATIC,
 )
 
 CPU_SPEED = BulkNumbers(
-    (lambda i: '1.3.6.1.4.1.232.1.2.2.1.1.4.%i' % i),
+    '1.3.6.1.4.1.232.1.2.2.1.1.4',
     'speed',
+    volatility=SLOW,
 )
 
 CPU_STEP = BulkNumbers(
-    (lambda i: '1.3.6.1.4.1.232.1.2.2.1.1.5.%i' % i),
+    '1.3.6.1.4.1.232.1.2.2.1.1.5',
     'step',
+    volatility=STATIC,
 )
 
 CPU_STATUS = BulkEnums(
-    (lambda i: '1.3.6.1.4.1.232.1.2.2.1.1.6.%i' % i),
+    '1.3.6.1.4.1.232.1.2.2.1.1.6',
     'status',
     {
         1: 'unknown',
@@ -30,17 +33,19 @@ CPU_STATUS = BulkEnums(
 )
 
 CORES_ENABLED = BulkNumbers(
-    (lambda i: '1.3.6.1.4.1.232.1.2.2.1.1.15.%i' % i),
+    '1.3.6.1.4.1.232.1.2.2.1.1.15',
     'cores_enabled',
+    volatility=STATIC,
 )
 
 THREADS_AVAILABLE = BulkNumbers(
-    (lambda i: '1.3.6.1.4.1.232.1.2.2.1.1.25.%i' % i),
+    '1.3.6.1.4.1.232.1.2.2.1.1.25',
     'threads_available',
+    volatility=STATIC,
 )
 
 CPU_POWER_STATUS = BulkEnums(
-    (lambda i: '1.3.6.1.4.1.232.1.2.2.1.1.26.%i' % i),
+    '1.3.6.1.4.1.232.1.2.2.1.1.26',
     'power_status',
     {
         1: 'unknown',
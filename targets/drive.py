@@ -1,56 +1,64 @@
-from snmp_groups import BulkEnums, BulkNumbers, BulkStrings
+from snmp_groups import BulkEnums, BulkNumbers, BulkStrings, STATIC, SLOW
 
 DRIVE_INDEX = '1.3.6.1.4.1.232.3.2.5.1.1.2'
 
 # controller index
 # DRIVE_CONTROLLER = BulkNumbers(
-#     (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 1) + i),
+#     '1.3.6.1.4.1.232.3.2.5.1.1.1',
 #     'controller'
 # )
 
 DRIVE_PORT = BulkStrings(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 62) + i),
-    'port'
+    '1.3.6.1.4.1.232.3.2.5.1.1.62',
+    'port',
+    volatility=STATIC,
 )
 
 DRIVE_BOX = BulkNumbers(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 63) + i),
-    'box'
+    '1.3.6.1.4.1.232.3.2.5.1.1.63',
+    'box',
+    volatility=STATIC,
 )
 
 DRIVE_BAY = BulkNumbers(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 5) + i),
-    'bay'
+    '1.3.6.1.4.1.232.3.2.5.1.1.5',
+    'bay',
+    volatility=STATIC,
 )
 
 DRIVE_VENDOR = BulkStrings(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 3) + i),
+    '1.3.6.1.4.1.232.3.2.5.1.1.3',
     'vendor',
+    volatility=STATIC,
 )
 
 # this may be slightly redundant
 DRIVE_LOCATION = BulkStrings(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 64) + i),
+    '1.3.6.1.4.1.232.3.2.5.1.1.64',
     'location',
+    volatility=STATIC,
 )
 
 DRIVE_SERIAL = BulkStrings(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 51) + i),
+    '1.3.6.1.4.1.232.3.2.5.1.1.51',
     'serial',
+    volatility=STATIC,
 )
 
 DRIVE_FIRMWARE = BulkStrings(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 4) + i),
+    '1.3.6.1.4.1.232.3.2.5.1.1.4',
     'firmware',
+    volatility=STATIC,
 )
 
 DRIVE_SIZE = BulkNumbers(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 45) + i),
+    '1.3.6.1.4.1.232.3.2.5.1.1.45',
     'size',
+    volatility=STATIC,
 )
 
 DRIVE_LINK_RATE = BulkEnums(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 65) + i),
+    '1.3.6.1.4.1.232.3.2.5.1.1.65',
     'link_rate',
     {
         1: 'other',
@@ -58,26 +66,29 @@ DRIVE_LINK_RATE = BulkEnums(
         3: '3.0Gbps',
         4: '6.0Gbps',
         5: '12.0Gbps',
-    }
+    },
+    volatility=SLOW,
 )
 
 DRIVE_TEMP = BulkNumbers(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 70) + i),
+    '1.3.6.1.4.1.232.3.2.5.1.1.70',
     'temperature'
 )
 
 DRIVE_TEMP_THRESHOLD = BulkNumbers(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 71) + i),
-    'temperature_threshold'
+    '1.3.6.1.4.1.232.3.2.5.1.1.71',
+    'temperature_threshold',
+    volatility=SLOW,
 )
 
 DRIVE_TEMP_MAX = BulkNumbers(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 72) + i),
-    'temperature_maximum'
+    '1.3.6.1.4.1.232.3.2.5.1.1.72',
+    'temperature_maximum',
+    volatility=SLOW,
 )
 
 DRIVE_STATUS = BulkEnums(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 6) + i),
+    '1.3.6.1.4.1.232.3.2.5.1.1.6',
     'status',
     {
         1: 'Other',
@@ -93,7 +104,7 @@ DRIVE_STATUS = BulkEnums(
 )
 
 DRIVE_CONDITION = BulkEnums(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 37) + i),
+    '1.3.6.1.4.1.232.3.2.5.1.1.37',
     'condition',
     {
         1: 'other',
@@ -104,22 +115,24 @@ DRIVE_CONDITION = BulkEnums(
 )
 
 DRIVE_REFERENCE_TIME = BulkNumbers(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 9) + i),
-    'reference_time'
+    '1.3.6.1.4.1.232.3.2.5.1.1.9',
+    'reference_time',
+    volatility=SLOW,
 )
 
 DRIVE_SUPPORTS_PREDICTIVE_FAILURE_MONITORING = BulkEnums(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 52) + i),
+    '1.3.6.1.4.1.232.3.2.5.1.1.52',
     'predictive_failure',
     {
         1: 'other',
         2: 'notAvailable',
         3: 'available'
-    }
+    },
+    volatility=STATIC,
 )
 
 DRIVE_SMART_STATUS = BulkEnums(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 57) + i),
+    '1.3.6.1.4.1.232.3.2.5.1.1.57',
     'smart_status',
     {
         1: 'other',
@@ -129,7 +142,7 @@ DRIVE_SMART_STATUS = BulkEnums(
 )
 
 DRIVE_ROTATIONAL_SPEED = BulkEnums(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 59) + i),
+    '1.3.6.1.4.1.232.3.2.5.1.1.59',
     'rotational_speed',
     {
         1: 'other',
@@ -137,18 +150,44 @@ DRIVE_ROTATIONAL_SPEED = BulkEnums(
         3: '10k rpm',
         4: '15k rpm',
         5: 'ssd',
-    }
+    },
+    volatility=STATIC,
 )
 
 DRIVE_MEDIA_TYPE = BulkEnums(
-    (lambda i: (1, 3, 6, 1, 4, 1, 232, 3, 2, 5, 1, 1, 69) + i),
+    '1.3.6.1.4.1.232.3.2.5.1.1.69',
     'media_type',
     {
         1: 'other',
         2: 'rotatingPlatters',
         3: 'solidState',
-    }
-)
+    },
+    volatility=STATIC,
+)
+
+
+# for debugging
+DRIVE_VALUES = [
+    DRIVE_PORT,
+    DRIVE_BOX,
+    DRIVE_BAY,
+    DRIVE_VENDOR,
+    DRIVE_LOCATION,
+    DRIVE_SERIAL,
+    DRIVE_FIRMWARE,
+    DRIVE_SIZE,
+    DRIVE_LINK_RATE,
+    DRIVE_TEMP,
+    DRIVE_TEMP_THRESHOLD,
+    DRIVE_TEMP_MAX,
+    DRIVE_STATUS,
+    DRIVE_CONDITION,
+    DRIVE_REFERENCE_TIME,
+    DRIVE_SUPPORTS_PREDICTIVE_FAILURE_MONITORING,
+    DRIVE_SMART_STATUS,
+    DRIVE_ROTATIONAL_SPEED,
+    DRIVE_MEDIA_TYPE,
+]
 
 
 # there appear to be a hell of a lot more, but I don't have the time to add them all right now
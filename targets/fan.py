@@ -1,9 +1,9 @@
-from snmp_groups import BulkEnums
+from snmp_groups import BulkEnums, STATIC
 
 FAN_INDEX = '1.3.6.1.4.1.232.6.2.6.7.1.2.0'
 
 FAN_LOCALE = BulkEnums(
-    (lambda i: '1.3.6.1.4.1.232.6.2.6.7.1.3.0.%i' % i),
+    '1.3.6.1.4.1.232.6.2.6.7.1.3.0',
     'locale',
     {
         1: 'other',
@@ -24,11 +24,12 @@ FAN_LOCALE = BulkEnums(
         16: 'network slot',
         17: 'blade slot',
         18: 'virtual',
-    }
+    },
+    volatility=STATIC,
 )
 
 FAN_PRESENT = BulkEnums(
-    (lambda i: '1.3.6.1.4.1.232.6.2.6.7.1.4.0.%i' % i),
+    '1.3.6.1.4.1.232.6.2.6.7.1.4.0',
     'presence',
     {
         1: 'other',
@@ -38,7 +39,7 @@ FAN_PRESENT = BulkEnums(
 )
 
 FAN_PRESENCE_TEST = BulkEnums(
-    (lambda i: '1.3.6.1.4.1.232.6.2.6.7.1.5.0.%i' % i),
+    '1.3.6.1.4.1.232.6.2.6.7.1.5.0',
     'presence_test',
     {
         1: 'other',
@@ -48,7 +49,7 @@ FAN_PRESENCE_TEST = BulkEnums(
 )
 
 FAN_SPEED = BulkEnums(
-    (lambda i: '1.3.6.1.4.1.232.6.2.6.7.1.6.0.%i' % i),
+    '1.3.6.1.4.1.232.6.2.6.7.1.6.0',
     'speed',
     {
         1: 'other',
@@ -58,7 +59,7 @@ FAN_SPEED = BulkEnums(
 )
 
 FAN_CONDITION = BulkEnums(
-    (lambda i: '1.3.6.1.4.1.232.6.2.6.7.1.6.0.%i' % i),
+    '1.3.6.1.4.1.232.6.2.6.7.1.6.0',
     'condition',
     {
         1: 'other',
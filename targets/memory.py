@@ -1,42 +1,46 @@
-from snmp_groups import BulkEnums, BulkNumbers, BulkStrings
+from snmp_groups import BulkEnums, BulkNumbers, BulkStrings, STATIC
 
 MEMORY_INDEX = '1.3.6.1.4.1.232.6.2.14.13.1.1'
 
 MEMORY_LOCATION = BulkStrings(
-    (lambda i: '1.3.6.1.4.1.232.6.2.14.13.1.13.%i' % i),
+    '1.3.6.1.4.1.232.6.2.14.13.1.13',
     'location',
+    volatility=STATIC,
 )
 
 MEMORY_MANUFACTURER = BulkStrings(
-    (lambda i: '1.3.6.1.4.1.232.6.2.14.13.1.9.%i' % i),
+    '1.3.6.1.4.1.232.6.2.14.13.1.9',
     'manufacturer',
+    volatility=STATIC,
 )
 
 MEMORY_PART_NUMBER = BulkStrings(
-    (lambda i: '1.3.6.1.4.1.232.6.2.14.13.1.10.%i' % i),
+    '1.3.6.1.4.1.232.6.2.14.13.1.10',
     'part_number',
+    volatility=STATIC,
 )
 
 MEMORY_SIZE = BulkNumbers(
-    (lambda i: '1.3.6.1.4.1.232.6.2.14.13.1.6.%i' % i),
+    '1.3.6.1.4.1.232.6.2.14.13.1.6',
     'size',
+    volatility=STATIC,
 )
 
 # this is an enum, but I don't know the mappings
 # I also don't have HP smart ram for testing
 # MEMORY_TECHNOLOGY = BulkNumbers(
-#     (lambda i: '1.3.6.1.4.1.232.6.2.14.13.1.8.%i' % i),
+#     '1.3.6.1.4.1.232.6.2.14.13.1.8',
 #     'technology',
 # )
 
 # this is another enum, but I don't know the mappings
 # MEMORY_TYPE = BulkNumbers(
-#     (lambda i: '1.3.6.1.4.1.232.6.2.14.13.1.7.%i' % i),
+#     '1.3.6.1.4.1.232.6.2.14.13.1.7',
 #     'type',
 # )
 
 MEMORY_STATUS = BulkEnums(
-    (lambda i: '1.3.6.1.4.1.232.6.2.14.13.1.19.%i' % i),
+    '1.3.6.1.4.1.232.6.2.14.13.1.19',
     'status',
     {
         1: 'other',
@@ -56,7 +60,7 @@ MEMORY_STATUS = BulkEnums(
 )
 
 MEMORY_CONDITION = BulkEnums(
-    (lambda i: '1.3.6.1.4.1.232.6.2.14.13.1.20.%i' % i),
+    '1.3.6.1.4.1.232.6.2.14.13.1.20',
     'condition',
     {
         1: 'other',
@@ -1,19 +1,20 @@
-from snmp_groups import BulkEnums, BulkNumbers
+from snmp_groups import BulkEnums, BulkNumbers, STATIC, SLOW
 
 TEMP_INDEX = '1.3.6.1.4.1.232.6.2.6.8.1.2.0'
 
 TEMP_CELSIUS = BulkNumbers(
-    (lambda i: '1.3.6.1.4.1.232.6.2.6.8.1.4.0.%i' % i),
+    '1.3.6.1.4.1.232.6.2.6.8.1.4.0',
     'celsius',
 )
 
 TEMP_THRESHOLD = BulkNumbers(
-    (lambda i: '1.3.6.1.4.1.232.6.2.6.8.1.5.0.%i' % i),
+    '1.3.6.1.4.1.232.6.2.6.8.1.5.0',
     'threshold',
+    volatility=SLOW,
 )
 
 TEMP_SENSOR_LOCALE = BulkEnums(
-    (lambda i: '1.3.6.1.4.1.232.6.2.6.8.1.3.0.%i' % i),
+    '1.3.6.1.4.1.232.6.2.6.8.1.3.0',
     'sensor_locale',
     {
         1: 'other',
@@ -29,11 +30,12 @@ TEMP_SENSOR_LOCALE = BulkEnums(
         11: 'ambent',
         12: 'chassis',
         13: 'bridge card',
-    }
+    },
+    volatility=STATIC,
 )
 
 TEMP_THRESHOLD_TYPE = BulkEnums(
-    (lambda i: '1.3.6.1.4.1.232.6.2.6.8.1.7.0.%i' % i),
+    '1.3.6.1.4.1.232.6.2.6.8.1.7.0',
     'threshold_type',
     {
         1: 'other',
@@ -41,11 +43,12 @@ TEMP_THRESHOLD_TYPE = BulkEnums(
         9: 'caution',
         15: 'critical',
         16: 'noreaction',
-    }
+    },
+    volatility=STATIC,
 )
 
 TEMP_CONDITION = BulkEnums(
-    (lambda i: '1.3.6.1.4.1.232.6.2.6.8.1.6.0.%i' % i),
+    '1.3.6.1.4.1.232.6.2.6.8.1.6.0',
     'condition',
     {
         1: 'other',
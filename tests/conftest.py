@@ -0,0 +1,38 @@
+# the modules live at the top of the repo, next to main.py
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pysnmp.hlapi import CommunityData, UdpTransportTarget, ContextData
+
+from snmp import SnmpConfiguration
+from snmp_lite import LiteEngine
+from sim_agent import SimulatedIlo, generate_walk, DEFAULT_SIZES
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def lite_engine() -> LiteEngine:
+    return LiteEngine()
+
+
+@pytest.fixture
+def start_agent():
+    """ starts a SimulatedIlo (or a subclass) on a free port, with made up tables of the given sizes """
+    def start(agent_class: type = SimulatedIlo, sizes: dict[str, int] | None = None, **kwa) -> SimulatedIlo:
+        agent = agent_class(generate_walk({**DEFAULT_SIZES, **(sizes or {})}), **kwa)
+        agent.start()
+        return agent
+
+    return start
+
+
+@pytest.fixture
+def lite_config(lite_engine):
+    """ makes an SnmpConfiguration that talks to an agent with the built-in client """
+    def make(agent: SimulatedIlo, **kwa) -> SnmpConfiguration:
+        return SnmpConfiguration(lite_engine, CommunityData('public'), UdpTransportTarget(agent.address, timeout=0.5, retries=1), ContextData(), **kwa)
+
+    return make
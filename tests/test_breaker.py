@@ -0,0 +1,70 @@
+from breaker import CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN, OPEN
+
+import pytest
+import time
+
+
+def open_breaker(backoff: float = 0.05) -> CircuitBreaker:
+    breaker = CircuitBreaker('test', threshold=2, backoff=backoff)
+    breaker.failed()
+    breaker.failed()
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_open_fails_fast():
+    breaker = open_breaker()
+    with pytest.raises(CircuitOpenError):
+        breaker.check_request()
+
+
+def test_only_the_probe_goes_through_while_half_open():
+    breaker = open_breaker()
+    time.sleep(0.06)
+
+    breaker.check_request()  # the probe
+    assert breaker.state == HALF_OPEN
+    for _ in range(3):
+        with pytest.raises(CircuitOpenError):
+            breaker.check_request()
+
+    breaker.succeeded()
+    assert breaker.state == CLOSED
+    breaker.check_request()
+
+
+def test_failed_probe_backs_off_longer():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    breaker.check_request()
+    breaker.failed()
+    assert breaker.state == OPEN
+
+    time.sleep(0.06)
+    with pytest.raises(CircuitOpenError):
+        breaker.check_request()  # 0.1 seconds this time
+    time.sleep(0.05)
+    breaker.check_request()
+
+
+def test_scrape_probe_is_the_only_request():
+    breaker = open_breaker()
+    time.sleep(0.06)
+
+    assert breaker.check_scrape()
+    breaker.check_request()  # the GET of the probe oid
+    with pytest.raises(CircuitOpenError):
+        breaker.check_scrape()
+    with pytest.raises(CircuitOpenError):
+        breaker.check_request()
+
+
+def test_unanswered_probe_is_given_up_on():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    breaker.check_request()
+
+    time.sleep(0.06)
+    breaker.check_request()  # another probe
+    with pytest.raises(CircuitOpenError):
+        breaker.check_request()
@@ -0,0 +1,54 @@
+from chunk_size import AdaptiveChunkSize, RELAX_AFTER
+from breaker import CircuitBreaker
+from snmp import check_response, EngineError
+from snmp_lite import TIMEOUT_ERROR
+
+import pytest
+import time
+
+
+def settle(chunk_size: AdaptiveChunkSize, requests: int = 100):
+    """ full requests that all cost the same per var bind, so it grows as far as it's allowed to """
+    for _ in range(requests):
+        chunk_size.succeeded(chunk_size.size, chunk_size.size * 0.001)
+
+
+def test_grows_to_max():
+    chunk_size = AdaptiveChunkSize(16, 4, 128)
+    settle(chunk_size)
+    assert chunk_size.size == 128
+
+
+def test_too_big_is_a_ceiling_until_relaxed():
+    chunk_size = AdaptiveChunkSize(64, 4, 128)
+    chunk_size.failed(64)
+    assert chunk_size.size == 32
+
+    settle(chunk_size)
+    assert chunk_size.size == 63
+
+    settle(chunk_size, RELAX_AFTER)
+    assert chunk_size.size > 63
+
+
+def test_timeouts_dont_lower_the_ceiling():
+    chunk_size = AdaptiveChunkSize(128, 4, 128)
+    chunk_size.failed(128, too_big=False)
+    assert chunk_size.size == 64
+
+    settle(chunk_size)
+    assert chunk_size.size == 128
+
+
+def test_outage_doesnt_shrink_more_than_once(start_agent, lite_config):
+    chunk_size = AdaptiveChunkSize(128, 4, 128)
+    c = lite_config(start_agent(), chunk_size=chunk_size, breaker=CircuitBreaker('test'))
+
+    for _ in range(10):
+        with pytest.raises(EngineError):
+            check_response(c, chunk_size.size, 0, time.monotonic(), TIMEOUT_ERROR, 0, 0, [])
+    assert chunk_size.size == 64
+
+    c.breaker.succeeded()
+    settle(chunk_size)
+    assert chunk_size.size == 128
@@ -0,0 +1,53 @@
+from orchestrator import ScrapeOrchestrator
+from deadline import Deadline
+from sim_agent import SimulatedIlo
+from snmp import parse_oid
+from targets.drive import DRIVE_INDEX
+import main
+
+import pytest
+
+DRIVE_TABLE = parse_oid(DRIVE_INDEX)[:-1]
+
+
+class SlowDriveIlo(SimulatedIlo):
+    """ takes its time with anything in the drive table """
+    def get_latency(self, pdu_type: int, oids: list[tuple[int]]) -> float:
+        if any(oid[:len(DRIVE_TABLE)] == DRIVE_TABLE for oid in oids):
+            return 0.1
+        return 0
+
+
+@pytest.fixture
+def create_orchestrator():
+    main.init(main.arg_parser.parse_args(['--snmp-lite']))
+
+    def create(agent: SimulatedIlo) -> ScrapeOrchestrator:
+        host, port = agent.address
+        return main.create_target_collector(host, port, 'public')
+
+    return create
+
+
+def get_names(results: dict) -> set[str]:
+    return {family.name for families in results.values() for family in families}
+
+
+def test_slow_table_leaves_out_only_its_collector(start_agent, create_orchestrator):
+    # scanning 400 drives at 16 rows a request takes seconds, far past the deadline
+    orchestrator = create_orchestrator(start_agent(SlowDriveIlo, {'drive': 400}))
+    results = orchestrator.scrape_all(Deadline(1.0))
+
+    names = get_names(results)
+    assert 'ilo_server_power_draw' in names
+    assert 'ilo_temperature_celsius' in names
+    assert not any(name.startswith('ilo_drive_') for name in names)
+    assert len(results) == len(orchestrator.collectors) - 1
+
+
+def test_everything_without_deadline(start_agent, create_orchestrator):
+    orchestrator = create_orchestrator(start_agent(SlowDriveIlo, {'drive': 8}))
+    results = orchestrator.scrape_all()
+
+    assert len(results) == len(orchestrator.collectors)
+    assert 'ilo_drive_size' in get_names(results)
@@ -0,0 +1,46 @@
+from probe import ProbeTargets, make_probe_app, parse_target
+
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+import gc
+import weakref
+
+
+class ConstantCollector(Collector):
+    def collect(self):
+        yield GaugeMetricFamily('ilo_test', 'Always 1', value=1)
+
+
+def probe(app, target: str) -> bytes:
+    statuses = []
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/probe', 'QUERY_STRING': 'target=%s' % target}
+    body = b''.join(app(environ, lambda status, headers: statuses.append(status)))
+    assert statuses == ['200 OK']
+    return body
+
+
+def test_forgotten_targets_are_freed():
+    forgotten = []
+    targets = ProbeTargets(lambda target: [ConstantCollector()], 2, on_forget=forgotten.append)
+    app = make_probe_app(targets, None, 161, 'public')
+
+    assert b'ilo_test 1.0' in probe(app, 'first')
+    first = weakref.ref(targets.get_registry(parse_target({'target': ['first']}, 161, 'public')))
+    for i in range(10):
+        probe(app, 'other%i' % i)
+
+    assert len(targets) == 2
+    assert len(forgotten) == 9
+    gc.collect()
+    assert first() is None
+
+
+def test_render_cache_kept_between_probes():
+    targets = ProbeTargets(lambda target: [ConstantCollector()], 2)
+    app = make_probe_app(targets, None, 161, 'public')
+
+    probe(app, 'first')
+    probe(app, 'first')
+    assert b'ilo_exporter_render_duration_seconds_count{format="text/plain"} 2.0' in probe(app, 'first')
+
@@ -0,0 +1,36 @@
+from snmp import snmp_bulk_walk
+from snmp_lite import GET_BULK
+from sim_agent import SimulatedIlo
+from targets.temp import TEMP_INDEX
+
+
+class RepeatingBulkIlo(SimulatedIlo):
+    """ answers GETBULK with the oids it was asked for instead of the ones after them, like some broken agents """
+    def answer(self, pdu_type: int, oids: list[tuple[int]], non_repeaters: int, max_repetitions: int) -> tuple[int, int, list]:
+        if pdu_type == GET_BULK:
+            return 0, 0, [(oid, 1) for oid in oids]
+        return super().answer(pdu_type, oids, non_repeaters, max_repetitions)
+
+
+def test_bulk_walk_falls_back_to_get_next(start_agent, lite_config):
+    c = lite_config(start_agent(RepeatingBulkIlo))
+
+    rows = snmp_bulk_walk(c, TEMP_INDEX)
+    assert [value for _, value in rows] == list(range(1, 41))
+    assert c.max_repetitions == 0
+
+
+class SmallBulkIlo(SimulatedIlo):
+    """ answers GETBULK with tooBig when more than 6 var binds would come back, counting every row """
+    def answer(self, pdu_type: int, oids: list[tuple[int]], non_repeaters: int, max_repetitions: int) -> tuple[int, int, list]:
+        if pdu_type == GET_BULK and len(oids) * max_repetitions > 6:
+            return 1, 0, [(oid, None) for oid in oids]
+        return super().answer(pdu_type, oids, non_repeaters, max_repetitions)
+
+
+def test_bulk_walk_asks_for_fewer_rows_on_too_big(start_agent, lite_config):
+    c = lite_config(start_agent(SmallBulkIlo))
+
+    rows = snmp_bulk_walk(c, TEMP_INDEX)
+    assert [value for _, value in rows] == list(range(1, 41))
+    assert c.max_repetitions > 0
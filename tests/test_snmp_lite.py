@@ -0,0 +1,123 @@
+# the codec of the built-in client, checked against what pysnmp makes of the same messages
+
+from snmp_lite import encode_oid, decode_oid, encode_request, encode_message, decode_message, decode_response, DecodeError, END_OF_MIB, GET, GET_BULK, RESPONSE
+
+from pyasn1.codec.ber import encoder, decoder
+from pysnmp.proto import api, rfc1902, rfc1905
+
+import pytest
+
+P = api.protoModules[api.protoVersion2c]
+
+OIDS = [
+    (1, 3, 6, 1, 4, 1, 232, 6, 2, 6, 8, 1, 4, 0, 1),
+    (1, 3, 6, 1, 2, 1, 1, 3, 0),
+    (0, 39),
+    (1, 0, 127, 128, 16383, 16384),
+    (2, 47, 1),
+    (2, 48, 1),  # the first subidentifier is past a byte from here on
+    (2, 100, 3),
+    (2, 999, 2 ** 32 - 1),
+]
+
+
+def pysnmp_message(pdu, community: str = 'public') -> bytes:
+    message = P.Message()
+    P.apiMessage.setDefaults(message)
+    P.apiMessage.setCommunity(message, community)
+    P.apiMessage.setPDU(message, pdu)
+    return encoder.encode(message)
+
+
+def pysnmp_decode(data: bytes):
+    message, rest = decoder.decode(data, asn1Spec=P.Message())
+    assert rest == b''
+    return P.apiMessage.getCommunity(message), P.apiMessage.getPDU(message)
+
+
+@pytest.mark.parametrize('oid', OIDS)
+def test_oid_matches_pysnmp(oid):
+    encoded = encoder.encode(rfc1902.ObjectName(oid))
+    assert encode_oid(oid) == encoded
+    assert decode_oid(encoded[2:]) == oid
+
+
+def test_truncated_oid():
+    with pytest.raises(DecodeError):
+        decode_oid(bytes([0x2b, 0x81]))
+    with pytest.raises(DecodeError):
+        decode_oid(b'')
+
+
+def test_request_decoded_by_pysnmp():
+    community, pdu = pysnmp_decode(encode_request(b'secret', GET, 12345, OIDS))
+
+    assert bytes(community) == b'secret'
+    assert isinstance(pdu, P.GetRequestPDU)
+    assert int(P.apiPDU.getRequestID(pdu)) == 12345
+    assert [tuple(oid) for oid, _ in P.apiPDU.getVarBinds(pdu)] == OIDS
+
+
+def test_bulk_request_decoded_by_pysnmp():
+    _, pdu = pysnmp_decode(encode_request(b'public', GET_BULK, 7, OIDS[:2], 0, 25))
+
+    assert isinstance(pdu, P.GetBulkRequestPDU)
+    assert int(P.apiBulkPDU.getNonRepeaters(pdu)) == 0
+    assert int(P.apiBulkPDU.getMaxRepetitions(pdu)) == 25
+    assert [tuple(oid) for oid, _ in P.apiBulkPDU.getVarBinds(pdu)] == OIDS[:2]
+
+
+def test_pysnmp_request_decoded():
+    pdu = P.GetBulkRequestPDU()
+    P.apiBulkPDU.setDefaults(pdu)
+    P.apiBulkPDU.setRequestID(pdu, 2 ** 31 - 1)
+    P.apiBulkPDU.setMaxRepetitions(pdu, 16)
+    P.apiBulkPDU.setVarBinds(pdu, [(oid, P.Null('')) for oid in OIDS])
+
+    community, pdu_type, request_id, non_repeaters, max_repetitions, var_binds = decode_message(pysnmp_message(pdu))
+    assert (community, pdu_type, request_id, non_repeaters, max_repetitions) == (b'public', GET_BULK, 2 ** 31 - 1, 0, 16)
+    assert var_binds == [(oid, None) for oid in OIDS]
+
+
+def test_pysnmp_response_decoded():
+    values = [
+        (rfc1902.Integer32(-5), -5),
+        (rfc1902.Integer32(2 ** 31 - 1), 2 ** 31 - 1),
+        (rfc1902.OctetString('Fan 1'), 'Fan 1'),
+        (rfc1902.OctetString(''), ''),
+        (rfc1902.Counter32(2 ** 32 - 1), 2 ** 32 - 1),
+        (rfc1902.Gauge32(128), 128),
+        (rfc1902.TimeTicks(1234567), 1234567),
+        (rfc1902.Counter64(2 ** 64 - 1), 2 ** 64 - 1),
+        (rfc1902.IpAddress('192.168.1.20'), '192.168.1.20'),
+        (rfc1905.noSuchInstance, None),
+        (rfc1905.noSuchObject, None),
+        (rfc1905.endOfMibView, END_OF_MIB),
+    ]
+    oids = [(1, 3, 6, 1, 4, 1, 232, i) for i in range(len(values))]
+
+    pdu = P.GetResponsePDU()
+    P.apiPDU.setDefaults(pdu)
+    P.apiPDU.setRequestID(pdu, 99)
+    P.apiPDU.setErrorStatus(pdu, 1)
+    P.apiPDU.setErrorIndex(pdu, 2)
+    P.apiPDU.setVarBinds(pdu, [(oid, value) for oid, (value, _) in zip(oids, values)])
+
+    request_id, error_status, error_index, var_binds = decode_response(pysnmp_message(pdu))
+    assert (request_id, error_status, error_index) == (99, 1, 2)
+    assert error_status.prettyPrint() == 'tooBig'
+    assert var_binds == [(oid, expected) for oid, (_, expected) in zip(oids, values)]
+
+
+def test_response_decoded_by_pysnmp():
+    var_binds = [(OIDS[0], 42), (OIDS[1], -1), (OIDS[2], 'drive bay 3'), (OIDS[3], None), (OIDS[6], END_OF_MIB)]
+    _, pdu = pysnmp_decode(encode_message(b'public', RESPONSE, 5, 0, 0, var_binds))
+
+    assert isinstance(pdu, P.GetResponsePDU)
+    decoded = P.apiPDU.getVarBinds(pdu)
+    assert [tuple(oid) for oid, _ in decoded] == [oid for oid, _ in var_binds]
+    assert int(decoded[0][1]) == 42
+    assert int(decoded[1][1]) == -1
+    assert str(decoded[2][1]) == 'drive bay 3'
+    assert decoded[3][1].tagSet == rfc1905.noSuchInstance.tagSet
+    assert decoded[4][1].tagSet == rfc1905.endOfMibView.tagSet